@@ -1,31 +1,75 @@
 # app.py
 import pandas as pd
-from flask import Flask, render_template, jsonify, url_for
+from flask import Flask, render_template, jsonify, url_for, request, Response, g
 import os
 from datetime import datetime, timedelta
 import traceback
+import hashlib
+import threading
+import time
+import bisect
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 import numpy as np
 import logging
-import sys # 导入 sys 用于强制刷新
+import logging.handlers
+import queue
+import atexit
+import sys
+import datastore
+import downsample
+import metrics
+import instrumentation
+import spatial
+import artifacts
+import forecasts
 
 TIME_OFFSET_HOURS = 8 # <--- 定义时间偏移量（小时）
 # --- 配置 ---
-# 获取 app.py 文件所在的目录
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-# 构建 data 文件夹的绝对路径
-DATA_FOLDER = os.path.join(BASE_DIR, 'data') # 使用绝对路径
-
-PREDICTION_FILENAME = 'final_recovered_predictions.csv'
-TRUTH_FILENAME = 'final_recovered_truth.csv' # 需要真实值文件
-GEO_INFO_FILENAME = 'station_geo_info.csv'
-TIMESTAMP_COLUMN_INDEX = 0 # 假设时间戳在第一列
+# 数据目录与文件名（DATA_FOLDER 可通过环境变量覆盖），与离线脚本共用，见 config.py
+from config import BASE_DIR, DATA_FOLDER, PREDICTION_FILENAME, TRUTH_FILENAME, GEO_INFO_FILENAME, TIMESTAMP_COLUMN_INDEX
+# 优先读取由 `python datastore.py` 生成的二进制列式存储（memmap，多 worker 共享页缓存）
+USE_BINARY_STORE = os.environ.get('USE_BINARY_STORE', '1') != '0'
+# 从 CSV 加载时把两张表转为 float32 按站点连续的紧凑布局（见 datastore.compact_tables）
+COMPACT_TABLES = os.environ.get('COMPACT_TABLES', '1') != '0'
+# 为 1 时使用 `python artifacts.py` 预计算的 /api/data 响应体与指标预聚合（DATA_FOLDER/artifacts/）
+USE_ARTIFACTS = os.environ.get('USE_ARTIFACTS', '1') != '0'
+# 为 0 时加载数据不构建指标预聚合（/api/metrics 不可用），供预计算脚本自行并行计算
+LOAD_METRIC_ROLLUP = os.environ.get('LOAD_METRIC_ROLLUP', '1') != '0'
+
 NUM_OVERVIEW_STATIONS = 5 # 概览页显示的电站数量
+RESPONSE_CACHE_MAX_ENTRIES = 1024 # API 响应缓存的最大条目数
+RESPONSE_CACHE_MAX_BYTES = 64 * 2**20 # API 响应缓存中响应体的总字节数上限（每个 worker）
+RESPONSE_CACHE_MAX_ENTRY_BYTES = 8 * 2**20 # 超过该大小的响应体（如多站点长范围 /api/range）不缓存
+# 后台检查数据文件变化的间隔（秒），0 表示关闭热加载
+MAX_RANGE_STATIONS = 50 # /api/range 单次请求最多的站点数
+MAX_RANGE_DAYS = 93 # /api/range 单次请求最长的时间跨度（天）
+MAX_DOWNSAMPLED_RANGE_DAYS = 3660 # 指定 points 降采样时允许的最长时间跨度（天）
+MIN_DOWNSAMPLE_POINTS = 10
+MAX_DOWNSAMPLE_POINTS = 10000
+STATION_PAGE_SIZE = 50 # /api/stations 默认每页站点数
+MAX_STATION_PAGE_SIZE = 500
+GEO_MAX_POINTS = 500 # /api/geo/stations 矩形内站点多于该数量时按网格聚合
+MAX_GEO_POINTS = 5000
+GEO_CLUSTER_GRID = 8 # 聚合时把矩形划分为 GEO_CLUSTER_GRID × GEO_CLUSTER_GRID 个单元
+MAX_GEO_CLUSTER_GRID = 64
+MAX_NEAREST_STATIONS = 100
+MAX_FORECAST_HORIZON_HOURS = 240 # horizon 参数（预报提前量，小时）的上限
+HOT_RELOAD_INTERVAL_SECONDS = float(os.environ.get('HOT_RELOAD_INTERVAL_SECONDS', '60'))
+OVERVIEW_INTERVAL_SECONDS = 15 * 60 # 概览数据的时间粒度，每到新间隔重新计算并推送一次
+OVERVIEW_STREAM_HEARTBEAT_SECONDS = 15 # SSE 无新数据时发送注释行保活的间隔
+OVERVIEW_STREAM_MAX_SECONDS = 3600 # 单个 SSE 连接的最长时长，到期后由浏览器自动重连
+OVERVIEW_STREAM_RETRY_MS = 5000 # 断线后浏览器重连的等待时间
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper() # 设为 DEBUG 可查看逐请求的详细日志
+# 为 1 时日志先写入内存队列，由后台线程输出到 stderr，请求线程不会阻塞在 stderr 写入上
+LOG_QUEUE = os.environ.get('LOG_QUEUE', '0') == '1'
 
 # --- Flask 应用初始化 ---
 app = Flask(__name__)
 
 # --- 配置 Flask logger ---
-app.logger.setLevel(logging.DEBUG) # 设置日志级别为 DEBUG
+app.logger.setLevel(LOG_LEVEL) # 热路径上的日志为 DEBUG 级别，且使用 % 参数延迟格式化，未启用时几乎没有开销
 # 输出到 stderr，Gunicorn 通常更容易捕获 stderr
 handler = logging.StreamHandler(sys.stderr)
 # 加入进程 ID 帮助区分 worker 日志
@@ -34,24 +78,380 @@ handler.setFormatter(formatter)
 # 移除可能存在的旧 handlers，确保配置生效
 for h in app.logger.handlers:
      app.logger.removeHandler(h)
-app.logger.addHandler(handler)
-app.logger.info("Flask logger configured.")
+if LOG_QUEUE:
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+
+    log_listener = None
+
+    def _start_log_listener():
+        # fork 出的 worker 中没有监听线程，且父进程队列的内部锁状态不可靠，因此换新队列并重新启动
+        global log_listener
+        queue_handler.queue = queue.SimpleQueue()
+        log_listener = logging.handlers.QueueListener(queue_handler.queue, handler)
+        log_listener.start()
+
+    _start_log_listener()
+    os.register_at_fork(after_in_child=_start_log_listener)
+    atexit.register(lambda: log_listener.stop()) # 退出前输出队列中剩余的日志
+    app.logger.addHandler(queue_handler)
+else:
+    app.logger.addHandler(handler)
+app.logger.info(f"Flask logger configured (level {LOG_LEVEL}, queue {'on' if LOG_QUEUE else 'off'}).")
 # --- Logger 配置结束 ---
 
 
-# --- 全局变量 (无占位符) ---
-df_predictions = pd.DataFrame()
-df_truth = pd.DataFrame()
-df_geo = pd.DataFrame()
-STATION_NAMES = []
-STATION_DISPLAY_INFO = []
-AVAILABLE_DATES = []
+# --- 数据快照 ---
+@dataclass(frozen=True)
+class DataSnapshot:
+    """
+    一次 load_data() 的完整结果。发布后不再修改，更新数据时构建新快照并整体替换
+    全局 SNAPSHOT，请求处理函数在开始时取一次引用，因此不会看到半更新的状态。
+    """
+    version: int = 0
+    # 全量加载时取新快照的版本号，增量追加与只更新产物/预报批次的快照沿用：已有行的数据只在全量加载时变化
+    generation: int = 0
+    loaded_at: float = 0.0 # time.time()
+    load_seconds: float = 0.0
+    source_signature: tuple = ()
+    df_predictions: pd.DataFrame = field(default_factory=pd.DataFrame)
+    df_truth: pd.DataFrame = field(default_factory=pd.DataFrame)
+    df_geo: pd.DataFrame = field(default_factory=pd.DataFrame)
+    station_names: list = field(default_factory=list)
+    station_display_info: list = field(default_factory=list)
+    station_search_index: dict = field(default_factory=dict) # 站点 ID/名称前缀搜索索引，见 build_station_search_index()
+    station_coords: dict = field(default_factory=dict) # 按站点顺序对齐的经纬度/海拔，见 station_coordinates()
+    spatial_index: dict = None # 站点坐标的网格空间索引，见 spatial.build_index()
+    available_dates: list = field(default_factory=list)
+    # 日期 -> (起始行, 结束行) 的行偏移索引，以及站点 -> 列位置映射，供 API 直接切片
+    prediction_day_index: dict = field(default_factory=dict)
+    station_column_pos: dict = field(default_factory=dict)
+    overview_time_lookup: dict = field(default_factory=dict) # 概览页“当前最新时间点”查找结构，见 build_time_lookup()
+    # 增量读取状态：{'predictions'|'truth': (已读取字节偏移, 校验字节)}，见 datastore.csv_tail_state()
+    csv_tails: dict = field(default_factory=dict)
+    # 小时/日级预聚合：{'predictions'|'truth': {'hour': 段, 'day': 段, 'covered_until': 纳秒}}，见 downsample.build_rollup()
+    rollups: dict = field(default_factory=dict)
+    # 预测精度指标的小时级部分和及累加索引（按 station_names 顺序），见 metrics.build_rollup()
+    metric_rollup: dict = None
+    # 多批次预报（DATA_FOLDER/forecast_runs/）的 (目标时间, 发布时间) 索引，见 forecasts.build_index()；没有批次时为 None
+    forecast_index: dict = None
+    # 预计算产物（/api/data 响应体查找表等），见 artifacts.open_artifacts()；没有或已失效时为 None
+    artifacts: dict = None
+    # 可追加缓冲区，之后的快照共享（只追加，旧快照的视图不受影响）：二进制存储打开的表在加载时即可追加，
+    # 其余的表与对齐时间点在首次增量追加时创建
+    append_state: dict = None
+
+
+SNAPSHOT = DataSnapshot() # 当前生效的数据快照，只通过 publish_snapshot() 替换
+_load_lock = threading.Lock() # 保证同一时刻只有一个加载过程
+# 快照版本号单调递增，即使某次加载的结果被丢弃也不会复用，避免与按版本缓存的响应冲突
+_snapshot_versions = itertools.count(1)
+RELOAD_STATS = {'reloads': 0, 'failures': 0, 'ingests': 0, 'ingested_rows': 0, 'last_check': 0.0, 'last_error': ''}
+
+
+# --- 辅助函数：构建概览页的时间查找结构 ---
+def build_time_lookup(pred_index, truth_index):
+    """
+    基于预测与实际数据共同存在的时间点构建查找结构：
+      epochs:     已排序的 int64 纳秒时间戳，用于按绝对时间 searchsorted
+      minutes:    按一天中的分钟数排序后的数组
+      prefix_max: 与 minutes 同序的 epochs 前缀最大值，
+                  prefix_max[i] 即“分钟数 <= minutes[i] 的最新时间点”
+      base_count: minutes/prefix_max 覆盖的 epochs 个数；增量追加的时间点排在其后
+    """
+    aligned = pred_index.intersection(truth_index)
+    if len(aligned) == 0:
+        return {}
+    epochs = aligned.asi8
+    minutes = (aligned.hour * 60 + aligned.minute).to_numpy(dtype=np.int64)
+    order = np.argsort(minutes, kind='stable')
+    return {
+        'epochs': epochs,
+        'minutes': minutes[order],
+        'prefix_max': np.maximum.accumulate(epochs[order]),
+        'base_count': len(epochs),
+    }
+
+
+def find_latest_aligned_time(lookup, now):
+    """
+    O(log n) 查找概览页应展示的时间点：
+      1. 当天有数据时，取当天 <= now 的最新对齐时间点；
+      2. 否则（如回放历史数据），取一天中分钟数 <= now 的所有时间点中最新的一个。
+    返回 pd.Timestamp，找不到时返回 pd.NaT。
+    """
+    if not lookup:
+        return pd.NaT
+    now_ts = pd.Timestamp(now)
+    epochs = lookup['epochs']
+    pos = np.searchsorted(epochs, now_ts.value, side='right') - 1
+    if pos >= 0 and epochs[pos] >= now_ts.normalize().value:
+        return pd.Timestamp(epochs[pos])
+
+    current_minute = now_ts.hour * 60 + now_ts.minute
+    # 增量追加的时间点都晚于 base 部分，若其中有满足条件的，最新的一个即为答案
+    tail = epochs[lookup['base_count']:]
+    if len(tail):
+        tail_minutes = (tail // (60 * 10**9)) % (24 * 60)
+        matches = np.flatnonzero(tail_minutes <= current_minute)
+        if len(matches):
+            return pd.Timestamp(tail[matches[-1]])
+    pos = np.searchsorted(lookup['minutes'], current_minute, side='right') - 1
+    if pos < 0:
+        return pd.NaT
+    return pd.Timestamp(lookup['prefix_max'][pos])
+
+
+# --- 响应缓存：缓存序列化后的 JSON 字节及其 ETag ---
+class ResponseCache:
+    """
+    线程安全的有界 LRU 缓存，值为 (body_bytes, etag)。
+    同时限制条目数与响应体总字节数；单个响应体超过 max_entry_bytes 时不缓存。
+    """
+
+    def __init__(self, max_entries, max_bytes, max_entry_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry[0])
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[key] = entry
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRY_BYTES)
+
+
+# --- 运行指标（Prometheus 格式，由 /metrics 导出）---
+METRICS_REGISTRY = instrumentation.Registry()
+REQUEST_LATENCY = METRICS_REGISTRY.histogram(
+    'pv_http_request_duration_seconds', '请求处理耗时（不含 SSE 流的推送时间）', ('route', 'method', 'status'))
+PAYLOAD_BUILD_LATENCY = METRICS_REGISTRY.histogram(
+    'pv_api_payload_build_seconds', 'API 响应缓存未命中时切片/计算数据的耗时', ('route',))
+SERIALIZE_LATENCY = METRICS_REGISTRY.histogram(
+    'pv_api_serialize_seconds', 'API 响应缓存未命中时 JSON 序列化的耗时', ('route',))
+DATA_LOAD_LATENCY = METRICS_REGISTRY.histogram(
+    'pv_data_load_duration_seconds', '全量加载 (full) 与增量读取 (ingest) 的耗时', ('kind',), instrumentation.LOAD_BUCKETS)
+OVERVIEW_COMPUTATIONS = METRICS_REGISTRY.counter(
+    'pv_overview_computations_total', '概览数据的计算次数（每个间隔/快照一次，与订阅者数量无关）')
+ARTIFACT_LOOKUPS = METRICS_REGISTRY.counter(
+    'pv_artifact_lookups_total', '/api/data 查找预计算响应体的次数 (hit/miss)', ('result',))
+METRICS_REGISTRY.callback('pv_response_cache_hits_total', 'API 响应缓存命中次数', lambda: RESPONSE_CACHE.hits, 'counter')
+METRICS_REGISTRY.callback('pv_response_cache_misses_total', 'API 响应缓存未命中次数', lambda: RESPONSE_CACHE.misses, 'counter')
+METRICS_REGISTRY.callback('pv_response_cache_entries', 'API 响应缓存当前条目数', lambda: len(RESPONSE_CACHE))
+METRICS_REGISTRY.callback('pv_response_cache_bytes', 'API 响应缓存中响应体的总字节数', lambda: RESPONSE_CACHE.bytes)
+METRICS_REGISTRY.callback('pv_data_reloads_total', '热加载全量重新加载次数', lambda: RELOAD_STATS['reloads'], 'counter')
+METRICS_REGISTRY.callback('pv_data_reload_failures_total', '热加载失败次数', lambda: RELOAD_STATS['failures'], 'counter')
+METRICS_REGISTRY.callback('pv_data_ingests_total', '增量读取追加行的次数', lambda: RELOAD_STATS['ingests'], 'counter')
+METRICS_REGISTRY.callback('pv_data_ingested_rows_total', '增量读取的行数', lambda: RELOAD_STATS['ingested_rows'], 'counter')
+METRICS_REGISTRY.callback('pv_data_snapshot_version', '当前数据快照版本', lambda: SNAPSHOT.version)
+METRICS_REGISTRY.callback('pv_data_snapshot_stations', '当前快照中的站点数', lambda: len(SNAPSHOT.station_names))
+METRICS_REGISTRY.callback('pv_overview_stream_subscribers', '当前的概览 SSE 订阅连接数', lambda: OVERVIEW_BROADCASTER.subscribers)
+
+
+def encode_json(payload):
+    """
+    序列化为响应体字节，与 jsonify 一样使用紧凑分隔符；
+    预计算产物也使用该函数，保证与实时响应逐字节一致。
+    """
+    return app.json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def make_cached_json_response(key, build_payload):
+    """
+    从缓存取出（或构建并缓存）JSON 响应，附带强 ETag；
+    请求头 If-None-Match 命中时返回 304。
+    """
+    entry = RESPONSE_CACHE.get(key)
+    if entry is None:
+        with PAYLOAD_BUILD_LATENCY.time(request.url_rule.rule):
+            payload = build_payload()
+        with SERIALIZE_LATENCY.time(request.url_rule.rule):
+            body = encode_json(payload)
+        entry = (body, hashlib.sha1(body).hexdigest())
+        RESPONSE_CACHE.put(key, entry)
+    return make_json_response(*entry)
+
+
+def make_json_response(body, etag):
+    """已序列化的 JSON 响应体 + 强 ETag，请求头 If-None-Match 命中时返回 304。"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # 允许浏览器缓存，但每次需用 ETag 重新验证
+    return response.make_conditional(request)
+
+
+# --- 辅助函数：读取预测/实际数据表 ---
+def read_table(csv_path):
+    """
+    二进制存储存在且未过期时通过 memmap 打开（float32，只读，不复制），
+    否则回退为解析 CSV。
+    """
+    if USE_BINARY_STORE:
+        if datastore.store_is_fresh(csv_path):
+            app.logger.debug(f"--- [read_table] Opening binary store for {csv_path}")
+            return datastore.open_store(csv_path)
+        if datastore.read_meta(csv_path) is not None:
+            app.logger.warning(f"--- [read_table] Binary store for {csv_path} is stale; falling back to CSV. Run `python datastore.py` to rebuild.")
+    return pd.read_csv(csv_path, index_col=TIMESTAMP_COLUMN_INDEX, parse_dates=True)
+
+
+def read_appendable_table(csv_path):
+    """
+    预测/实际表：二进制存储可用（CSV 自转换后未变或只在末尾追加）时返回
+    (DataFrame, GrowableTable, tail_state)，转换之后追加的行已从 CSV 补读，之后的增量读取直接在存储上追加；
+    否则按 read_table() 读取，返回 (DataFrame, None, tail_state)。
+    """
+    if USE_BINARY_STORE:
+        opened = datastore.open_appendable(csv_path)
+        if opened is not None:
+            table, tail_state = opened
+            app.logger.debug("--- [read_table] Opened binary store for %s with %d rows", csv_path, len(table))
+            return table.frame(), table, tail_state
+    tail_state = datastore.csv_tail_state(csv_path) # 读取前记录文件末尾位置
+    return read_table(csv_path), None, tail_state
+
+
+# --- 辅助函数：构建按天的行偏移索引 ---
+def build_day_index(index):
+    """
+    基于已排序的 DatetimeIndex 构建 {'YYYY-MM-DD': (start, end)} 行偏移索引。
+    同一天的数据在排序后是连续的一段，因此 index[start:end] 即为该日全部数据。
+    """
+    if len(index) == 0:
+        return {}
+    days = index.values.astype('datetime64[D]')
+    unique_days, starts = np.unique(days, return_index=True)
+    ends = np.append(starts[1:], len(index))
+    day_strings = np.datetime_as_string(unique_days, unit='D')
+    return {str(day): (int(start), int(end)) for day, start, end in zip(day_strings, starts, ends)}
+
+
+# --- 辅助函数：站点显示信息与前缀搜索 ---
+def station_label(index):
+    return f"光伏电站{index}"
+
+
+def station_display_name(index):
+    """概览卡片与地图上显示的站点名称（index 为从 1 开始的序号），两处保持一致。"""
+    return f"光伏电站 {index}"
+
+
+def station_coordinates(station_names, df_geo):
+    """
+    地理信息按 station_id 一次性 reindex 对齐到站点顺序（不逐站做 .loc 标量查找），
+    同一站点重复出现时取第一条。返回 {'has_geo', 'longitude', 'latitude', 'elevation'} 数组，
+    缺失或不是有效数字的坐标为 NaN。
+    """
+    n = len(station_names)
+    coords = {'has_geo': np.zeros(n, dtype=bool)}
+    coords.update({col: np.full(n, np.nan) for col in ('longitude', 'latitude', 'elevation')})
+    if not df_geo.empty and 'station_id_str' in df_geo.columns:
+        geo = df_geo.drop_duplicates('station_id_str').set_index('station_id_str')
+        coords['has_geo'] = pd.Index(station_names).isin(geo.index)
+        aligned = geo.reindex(station_names)
+        for col in ('longitude', 'latitude', 'elevation'):
+            if col in aligned.columns:
+                coords[col] = pd.to_numeric(aligned[col], errors='coerce').to_numpy(dtype=np.float64)
+    return coords
+
+
+def build_station_display_info(station_names, coords):
+    """生成详情页下拉菜单的显示文本，coords 见 station_coordinates()。"""
+    lon, lat = coords['longitude'], coords['latitude']
+    valid = coords['has_geo'] & ~np.isnan(lon) & ~np.isnan(lat)
+    display_info = []
+    for index, (station_name, found, ok, x, y) in enumerate(zip(station_names, coords['has_geo'], valid, lon, lat), start=1):
+        if ok:
+            display_text = f"经:{x:.2f}, 纬:{y:.2f} (ID:{station_label(index)})"
+        elif found: # 经纬度不是有效数字
+            display_text = f"{station_label(index)} (ID:{station_name}, 地理信息错误)"
+        else:
+            display_text = f"{station_label(index)} (ID:{station_name}, 无地理信息)"
+        display_info.append({'id': station_name, 'display': display_text})
+    return display_info
+
+
+def build_station_search_index(station_names):
+    """
+    站点前缀搜索索引：站点 ID（转小写）与序号名称（光伏电站N）合并后排序，
+    前缀查询只需两次二分查找得到一段连续区间。
+    """
+    keys = [name.lower() for name in station_names] + [station_label(i) for i in range(1, len(station_names) + 1)]
+    positions = np.tile(np.arange(len(station_names)), 2)
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return {'keys': [keys[i] for i in order], 'positions': positions[order]}
+
+
+def search_stations(search_index, prefix):
+    """ID 或名称以 prefix 开头（不区分大小写）的站点下标，按站点顺序排列、去重。"""
+    keys = search_index.get('keys', [])
+    prefix = prefix.lower()
+    lo = bisect.bisect_left(keys, prefix)
+    hi = bisect.bisect_left(keys, prefix + '\U0010ffff', lo)
+    return np.unique(search_index['positions'][lo:hi]) if hi > lo else np.empty(0, dtype=np.int64)
 
 
 # --- 数据加载函数 (恢复 pd.read_csv, 保留详细日志) ---
 def load_data():
-    global df_predictions, df_truth, df_geo, STATION_NAMES, STATION_DISPLAY_INFO, AVAILABLE_DATES
+    """
+    从 DATA_FOLDER 加载全部数据，构建新的 DataSnapshot 并发布；返回新快照。
+    全部工作在局部变量上完成，发布前对正在处理的请求不可见。
+    """
+    with _load_lock:
+        snapshot = _load_data_locked()
+        publish_snapshot(snapshot)
+        app.logger.info(f"--- [load_data RESTORED] Snapshot version {snapshot.version} published.")
+        return snapshot
+
+
+def _load_data_locked():
+    """构建新快照并返回，不发布；由调用方检查后调用 publish_snapshot()。"""
+    load_start = time.perf_counter()
     app.logger.info("--- [load_data RESTORED] Function Start ---")
+    source_signature = data_source_signature() # 在读取前记录，读取期间文件再变化会在下一轮检查中被发现
+    df_predictions = pd.DataFrame()
+    df_truth = pd.DataFrame()
+    df_geo = pd.DataFrame()
+    STATION_NAMES = []
+    STATION_DISPLAY_INFO = []
+    AVAILABLE_DATES = []
+    PREDICTION_DAY_INDEX = {}
+    STATION_COLUMN_POS = {}
+    csv_tails = {}
+    tables = {} # {'predictions'|'truth': (存储打开的可追加表或 None, 读取得到的 DataFrame)}，见 read_appendable_table()
     app.logger.debug(f"--- [load_data RESTORED] Calculated BASE_DIR: {BASE_DIR}")
     app.logger.debug(f"--- [load_data RESTORED] Calculated DATA_FOLDER: {DATA_FOLDER}")
 
@@ -73,8 +473,6 @@ def load_data():
 
     except Exception as e:
         app.logger.error(f"--- [load_data RESTORED] Error listing DATA_FOLDER: {e}", exc_info=True)
-    handler.flush()
-    sys.stderr.flush()
 
     # --- 加载预测数据 ---
     prediction_filepath = os.path.join(DATA_FOLDER, PREDICTION_FILENAME)
@@ -85,16 +483,23 @@ def load_data():
             app.logger.error(f"--- [load_data RESTORED] [Pred] ERROR: File does not exist at path.")
             raise FileNotFoundError(f"Prediction file not found at {prediction_filepath}")
 
-        app.logger.debug(f"--- [load_data RESTORED] [Pred] File exists. Attempting pd.read_csv...")
+        app.logger.debug(f"--- [load_data RESTORED] [Pred] File exists. Attempting read_table...")
+        # 同时记录文件末尾位置，之后追加的行由 ingest_appended_rows() 增量读取
         # === 恢复读取 ===
-        df_predictions = pd.read_csv(prediction_filepath, index_col=TIMESTAMP_COLUMN_INDEX, parse_dates=True)
+        df_predictions, table, csv_tails['predictions'] = read_appendable_table(prediction_filepath)
+        tables['predictions'] = (table, df_predictions)
         # === 检查加载后是否为空 ===
         if df_predictions.empty:
-            app.logger.warning(f"--- [load_data RESTORED] [Pred] WARNING: pd.read_csv resulted in an empty DataFrame.")
+            app.logger.warning(f"--- [load_data RESTORED] [Pred] WARNING: read_table resulted in an empty DataFrame.")
         else:
-            app.logger.info(f"--- [load_data RESTORED] [Pred] pd.read_csv SUCCESS. Shape: {df_predictions.shape}")
+            app.logger.info(f"--- [load_data RESTORED] [Pred] read_table SUCCESS. Shape: {df_predictions.shape}")
+            # 排序保证同一天的数据行连续，便于按行偏移切片
+            if not df_predictions.index.is_monotonic_increasing:
+                df_predictions = df_predictions.sort_index()
             STATION_NAMES = df_predictions.columns.tolist() # 仅在成功加载后设置
-            AVAILABLE_DATES = sorted(df_predictions.index.normalize().unique().strftime('%Y-%m-%d').tolist()) # 仅在成功加载后设置
+            STATION_COLUMN_POS = {name: pos for pos, name in enumerate(STATION_NAMES)}
+            PREDICTION_DAY_INDEX = build_day_index(df_predictions.index)
+            AVAILABLE_DATES = list(PREDICTION_DAY_INDEX.keys()) # 已按日期排序
             app.logger.info(f"--- [load_data RESTORED] [Pred] Station names loaded: {len(STATION_NAMES)} stations.")
             app.logger.info(f"--- [load_data RESTORED] [Pred] Available dates loaded: {len(AVAILABLE_DATES)} dates.")
 
@@ -103,14 +508,16 @@ def load_data():
         # 确保全局变量为空列表
         STATION_NAMES = []
         AVAILABLE_DATES = []
+        PREDICTION_DAY_INDEX = {}
+        STATION_COLUMN_POS = {}
         df_predictions = pd.DataFrame()
     except Exception as e:
-        app.logger.error(f"--- [load_data RESTORED] [Pred] CAUGHT Exception during read_csv: {e}", exc_info=True)
+        app.logger.error(f"--- [load_data RESTORED] [Pred] CAUGHT Exception during read_table: {e}", exc_info=True)
         STATION_NAMES = []
         AVAILABLE_DATES = []
+        PREDICTION_DAY_INDEX = {}
+        STATION_COLUMN_POS = {}
         df_predictions = pd.DataFrame()
-    handler.flush()
-    sys.stderr.flush()
 
 
     # --- 加载真实数据 ---
@@ -122,25 +529,35 @@ def load_data():
             app.logger.error(f"--- [load_data RESTORED] [Truth] ERROR: File does not exist at path.")
             raise FileNotFoundError(f"Truth file not found at {truth_filepath}")
 
-        app.logger.debug(f"--- [load_data RESTORED] [Truth] File exists. Attempting pd.read_csv...")
+        app.logger.debug(f"--- [load_data RESTORED] [Truth] File exists. Attempting read_table...")
         # === 恢复读取 ===
-        df_truth = pd.read_csv(truth_filepath, index_col=TIMESTAMP_COLUMN_INDEX, parse_dates=True)
+        df_truth, table, csv_tails['truth'] = read_appendable_table(truth_filepath)
+        tables['truth'] = (table, df_truth)
         # === 检查加载后是否为空 ===
         if df_truth.empty:
-             app.logger.warning(f"--- [load_data RESTORED] [Truth] WARNING: pd.read_csv resulted in an empty DataFrame.")
+             app.logger.warning(f"--- [load_data RESTORED] [Truth] WARNING: read_table resulted in an empty DataFrame.")
         else:
-             app.logger.info(f"--- [load_data RESTORED] [Truth] pd.read_csv SUCCESS. Shape: {df_truth.shape}")
+             if not df_truth.index.is_monotonic_increasing:
+                 df_truth = df_truth.sort_index()
+             app.logger.info(f"--- [load_data RESTORED] [Truth] read_table SUCCESS. Shape: {df_truth.shape}")
 
     except FileNotFoundError as e:
         app.logger.error(f"--- [load_data RESTORED] [Truth] CAUGHT FileNotFoundError: {e}")
         df_truth = pd.DataFrame() # 确保为空
     except Exception as e:
-        app.logger.error(f"--- [load_data RESTORED] [Truth] CAUGHT Exception during read_csv: {e}", exc_info=True)
+        app.logger.error(f"--- [load_data RESTORED] [Truth] CAUGHT Exception during read_table: {e}", exc_info=True)
         df_truth = pd.DataFrame()
-    handler.flush()
-    sys.stderr.flush()
 
 
+    # --- 紧凑布局：CSV 解析得到的 float64 表转为 float32 按站点连续存放（memmap 存储已是该布局）---
+    needs_compaction = any((df.dtypes != datastore.VALUES_DTYPE).any() for df in (df_predictions, df_truth))
+    if COMPACT_TABLES and not df_predictions.empty and not df_truth.empty and needs_compaction:
+        try:
+            df_predictions, df_truth = datastore.compact_tables(df_predictions, df_truth)
+            app.logger.info(f"--- [load_data RESTORED] Tables compacted to {np.dtype(datastore.VALUES_DTYPE).name}, shared index: {df_predictions.index is df_truth.index}")
+        except Exception as e:
+            app.logger.error(f"--- [load_data RESTORED] Error compacting tables: {e}", exc_info=True)
+
     # --- 加载地理信息 ---
     geo_info_filepath = os.path.join(DATA_FOLDER, GEO_INFO_FILENAME)
     app.logger.debug(f"--- [load_data RESTORED] [Geo] Attempting path: {geo_info_filepath}")
@@ -152,7 +569,7 @@ def load_data():
                   app.logger.warning(f"--- [load_data RESTORED] [Geo] WARNING: pd.read_csv resulted in an empty DataFrame.")
              else:
                   app.logger.info(f"--- [load_data RESTORED] [Geo] pd.read_csv SUCCESS. Shape: {df_geo.shape}")
-                  # --- 在成功加载 df_geo 后才准备 geo_map ---
+                  # --- 在成功加载 df_geo 后检查列并准备字符串形式的 station_id ---
                   try:
                       # 检查必要的列
                       required_geo_cols = ['station_id', 'longitude', 'latitude']
@@ -161,63 +578,427 @@ def load_data():
                           df_geo = pd.DataFrame() # 置空 geo 数据，因为无法使用
                       else:
                           df_geo['station_id_str'] = df_geo['station_id'].astype(str)
-                          geo_map = df_geo.set_index('station_id_str')
-                          app.logger.debug("--- [load_data RESTORED] Geo info map created.")
                   except Exception as map_err:
-                      app.logger.error(f"--- [load_data RESTORED] Error creating geo map: {map_err}", exc_info=True)
+                      app.logger.error(f"--- [load_data RESTORED] Error preparing geo info: {map_err}", exc_info=True)
                       df_geo = pd.DataFrame() # 出错则置空
-                      geo_map = pd.DataFrame() # 确保 map 也为空
         else:
              app.logger.warning(f"--- [load_data RESTORED] [Geo] WARNING: File does not exist.")
              df_geo = pd.DataFrame()
     except Exception as e:
         app.logger.error(f"--- [load_data RESTORED] [Geo] CAUGHT Exception: {e}", exc_info=True)
         df_geo = pd.DataFrame()
-    handler.flush()
-    sys.stderr.flush()
 
 
-    # --- 准备二级页面站点显示信息列表 ---
-    STATION_DISPLAY_INFO = [] # 先清空
-    # 如果 df_predictions 加载失败, STATION_NAMES 会是空列表, 循环不会执行
+    # --- 准备二级页面站点显示信息列表与前缀搜索索引 ---
+    # 如果 df_predictions 加载失败, STATION_NAMES 会是空列表
     app.logger.debug(f"--- [load_data RESTORED] Preparing display info for {len(STATION_NAMES)} stations...")
-    geo_map = pd.DataFrame() # 重新定义在循环外，确保作用域
-    if not df_geo.empty and 'station_id_str' in df_geo.columns: # 确保 geo_map 可以创建
+    try:
+        station_coords = station_coordinates(STATION_NAMES, df_geo)
+    except Exception as e:
+        app.logger.error(f"--- [load_data RESTORED] Error aligning geo info: {e}", exc_info=True)
+        station_coords = station_coordinates(STATION_NAMES, pd.DataFrame())
+    STATION_DISPLAY_INFO = build_station_display_info(STATION_NAMES, station_coords)
+    station_search_index = build_station_search_index(STATION_NAMES)
+    app.logger.info(f"--- [load_data RESTORED] Station display info prepared: {len(STATION_DISPLAY_INFO)} items.")
+    # 站点坐标的网格空间索引，供地图矩形/最近站点查询使用
+    spatial_index = spatial.build_index(station_coords['longitude'], station_coords['latitude'], np.arange(len(STATION_NAMES)))
+    app.logger.info(f"--- [load_data RESTORED] Spatial index built: {0 if spatial_index is None else len(spatial_index['positions'])} stations with coordinates.")
+
+
+    # --- 最终检查 ---
+    app.logger.info(f"--- [load_data RESTORED] Final check: df_predictions empty? {df_predictions.empty}")
+    app.logger.info(f"--- [load_data RESTORED] Final check: df_truth empty? {df_truth.empty}")
+    # --- 构建概览页时间查找结构 ---
+    OVERVIEW_TIME_LOOKUP = {}
+    if not df_predictions.empty and not df_truth.empty:
+        try:
+            OVERVIEW_TIME_LOOKUP = build_time_lookup(df_predictions.index, df_truth.index)
+            app.logger.info(f"--- [load_data RESTORED] Overview time lookup built: {len(OVERVIEW_TIME_LOOKUP.get('epochs', []))} aligned time points.")
+        except Exception as e:
+            app.logger.error(f"--- [load_data RESTORED] Error building overview time lookup: {e}", exc_info=True)
+
+    # --- 构建小时/日级预聚合，供长时间范围的降采样查询使用 ---
+    rollups = {}
+    for key, df in (('predictions', df_predictions), ('truth', df_truth)):
+        if df.empty:
+            continue
+        try:
+            rollup_start = time.perf_counter()
+            rollups[key] = build_table_rollups(df)
+            app.logger.info(f"--- [load_data RESTORED] [{key}] Rollups built in {time.perf_counter() - rollup_start:.3f}s.")
+        except Exception as e:
+            app.logger.error(f"--- [load_data RESTORED] [{key}] Error building rollups: {e}", exc_info=True)
+
+    # --- 多批次预报索引 ---
+    forecast_index = load_forecast_index()
+
+    # --- 预计算产物（响应体查找表与指标预聚合）---
+    artifact_store = open_artifact_store(STATION_NAMES) if STATION_NAMES else None
+
+    # --- 预测精度指标预聚合 ---
+    metric_rollup = None
+    if artifact_store is not None and artifact_store['metric_rollup'] is not None:
+        metric_rollup = artifact_store['metric_rollup']
+        app.logger.info(f"--- [load_data RESTORED] Metric rollup opened from artifacts (run {artifact_store['run']}).")
+    elif OVERVIEW_TIME_LOOKUP and LOAD_METRIC_ROLLUP:
+        try:
+            metric_start = time.perf_counter()
+            metric_rollup = build_metric_rollup(df_predictions, df_truth, df_geo, STATION_NAMES, OVERVIEW_TIME_LOOKUP['epochs'])
+            app.logger.info(f"--- [load_data RESTORED] Metric rollup built in {time.perf_counter() - metric_start:.3f}s.")
+        except Exception as e:
+            app.logger.error(f"--- [load_data RESTORED] Error building metric rollup: {e}", exc_info=True)
+
+    # 只保留仍是存储视图的表（排序/紧凑转换会换成新的 DataFrame），其余在首次增量追加时再复制
+    tables = {key: table for key, (table, frame) in tables.items()
+              if table is not None and frame is (df_predictions if key == 'predictions' else df_truth)}
+
+    version = next(_snapshot_versions)
+    snapshot = DataSnapshot(
+        version=version,
+        generation=version,
+        loaded_at=time.time(),
+        load_seconds=time.perf_counter() - load_start,
+        source_signature=source_signature,
+        df_predictions=df_predictions,
+        df_truth=df_truth,
+        df_geo=df_geo,
+        station_names=STATION_NAMES,
+        station_display_info=STATION_DISPLAY_INFO,
+        station_search_index=station_search_index,
+        station_coords=station_coords,
+        spatial_index=spatial_index,
+        available_dates=AVAILABLE_DATES,
+        prediction_day_index=PREDICTION_DAY_INDEX,
+        station_column_pos=STATION_COLUMN_POS,
+        overview_time_lookup=OVERVIEW_TIME_LOOKUP,
+        csv_tails=csv_tails,
+        rollups=rollups,
+        metric_rollup=metric_rollup,
+        forecast_index=forecast_index,
+        artifacts=artifact_store,
+        append_state=tables or None,
+    )
+    DATA_LOAD_LATENCY.observe(snapshot.load_seconds, 'full')
+    app.logger.info(f"--- [load_data RESTORED] Snapshot version {snapshot.version} built in {snapshot.load_seconds:.3f}s.")
+    app.logger.info("--- [load_data RESTORED] Function End ---")
+    return snapshot
+
+
+# --- 快照发布与热加载 ---
+def publish_snapshot(snapshot, clear_cache=True):
+    """
+    原子地替换当前快照（单次引用赋值），并清空依赖旧数据的响应缓存。
+    clear_cache=False 用于已缓存的响应仍然有效的情况（数据未变，或缓存键已能区分变化的部分）。
+    """
+    global SNAPSHOT
+    SNAPSHOT = snapshot
+    if clear_cache:
+        RESPONSE_CACHE.clear()
+    OVERVIEW_BROADCASTER.wake() # 新数据可能改变概览，通知推送线程重新计算
+
+
+def load_forecast_index(previous=None):
+    """
+    读取 forecast_runs/ 下的全部预报批次并建立索引。previous 中已读取且文件未变化的批次表直接复用，
+    因此新批次到达时只读取新文件。单个文件读取失败时跳过该批次。
+    """
+    loaded = previous['sources'] if previous is not None else {}
+    sources, runs = {}, []
+    for issue_time, path in forecasts.list_runs(forecast_runs_folder()):
         try:
-             geo_map = df_geo.set_index('station_id_str')
+            mtime = os.stat(path).st_mtime_ns
+            if path in loaded and loaded[path][0] == mtime:
+                frame = loaded[path][1]
+            else:
+                frame = read_table(path)
+                if not frame.index.is_monotonic_increasing:
+                    frame = frame.sort_index()
         except Exception as e:
-             app.logger.error(f"--- [load_data RESTORED] Error setting index for geo_map again: {e}")
+            app.logger.error(f"--- [forecasts] Error reading forecast run {path}: {e}", exc_info=True)
+            continue
+        sources[path] = (mtime, frame)
+        runs.append((issue_time, frame))
+    index = forecasts.build_index(runs)
+    if index is not None:
+        index['sources'] = sources
+        app.logger.info(f"--- [forecasts] Forecast index built: {len(runs)} runs, {len(index['targets'])} target times.")
+    return index
+
+
+def artifact_sources():
+    return {key: os.path.join(DATA_FOLDER, name) for key, name in
+            (('predictions', PREDICTION_FILENAME), ('truth', TRUTH_FILENAME), ('geo', GEO_INFO_FILENAME))}
+
+
+def forecast_runs_folder():
+    return forecasts.runs_folder(DATA_FOLDER)
+
 
-    for index, station_name in enumerate(STATION_NAMES, start=1):
-        display_text = f"光伏电站{index} (ID:{station_name}, 无地理信息)" # 默认值
-        if not geo_map.empty and station_name in geo_map.index:
+def artifact_manifest_path():
+    return os.path.join(artifacts.artifact_folder(DATA_FOLDER), artifacts.MANIFEST_FILENAME)
+
+
+def open_artifact_store(station_names):
+    """打开与当前数据匹配的预计算产物；未启用、不存在或已失效时返回 None。"""
+    if not USE_ARTIFACTS:
+        return None
+    try:
+        store = artifacts.open_artifacts(artifacts.artifact_folder(DATA_FOLDER), station_names, artifact_sources())
+    except Exception as e:
+        app.logger.error(f"--- [artifacts] Error opening artifacts: {e}", exc_info=True)
+        return None
+    if store is None:
+        if os.path.exists(artifact_manifest_path()):
+            app.logger.warning("--- [artifacts] Artifacts do not match current data; serving live. Run `python artifacts.py` to rebuild.")
+        return None
+    app.logger.info(f"--- [artifacts] Opened run {store['run']}: {len(store['days'])} dates, metric rollup {'yes' if store['metric_rollup'] is not None else 'no'}.")
+    return store
+
+
+def data_source_signature():
+    """
+    数据文件（含二进制存储 meta 与预计算产物 manifest）的 (路径, size, mtime_ns) 元组，用于检测变化。
+    预报批次目录记为 (目录, 批次文件数, 最大 mtime_ns)。
+    """
+    paths = [os.path.join(DATA_FOLDER, name) for name in (PREDICTION_FILENAME, TRUTH_FILENAME, GEO_INFO_FILENAME)]
+    paths += [datastore.store_prefix(p) + '.meta.json' for p in paths[:2]]
+    paths.append(artifact_manifest_path())
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append((path, None, None))
+    signature.append((forecast_runs_folder(), *forecasts.folder_signature(forecast_runs_folder())))
+    return tuple(signature)
+
+
+def ingest_appended_rows(previous, signature):
+    """
+    增量读取预测/实际 CSV 末尾新追加的行并发布新快照，不重新解析历史数据。
+    每个 15 分钟间隔的开销为 O(站点数)：数值追加到预分配缓冲区（摊销），
+    日索引与对齐时间点只更新新增部分。无法增量处理（文件被改写等）时返回 None。
+    """
+    ingest_start = time.perf_counter()
+    state = previous.append_state or {}
+    if 'aligned' not in state:
+        # 首次追加：存储打开的表直接在预留列上追加，CSV 解析得到的表复制到可追加缓冲区（每个进程只发生一次）
+        state = {
+            'predictions': state['predictions'] if 'predictions' in state else datastore.GrowableTable(previous.df_predictions),
+            'truth': state['truth'] if 'truth' in state else datastore.GrowableTable(previous.df_truth),
+            'aligned': datastore.AppendBuffer(previous.overview_time_lookup['epochs']),
+        }
+    tails = dict(previous.csv_tails)
+    ranges = {}
+    for key, filename in (('predictions', PREDICTION_FILENAME), ('truth', TRUTH_FILENAME)):
+        table = state[key]
+        result = datastore.read_csv_tail(os.path.join(DATA_FOLDER, filename), tails[key], table.columns)
+        if result is None:
+            app.logger.info(f"--- [ingest] {filename} was rewritten, not appended; full reload required.")
+            return None
+        df_new, tails[key] = result
+        before = len(table)
+        table.append(df_new)
+        ranges[key] = (before, len(table))
+
+    # 新增时间戳中在另一张表里也存在的，追加到对齐时间点（二分查找判断存在性）
+    aligned = state['aligned']
+    candidates = []
+    for key, other in (('predictions', 'truth'), ('truth', 'predictions')):
+        start, end = ranges[key]
+        new_stamps = state[key].index_values()[start:end]
+        other_stamps = state[other].index_values()
+        pos = np.searchsorted(other_stamps, new_stamps).clip(max=max(len(other_stamps) - 1, 0))
+        candidates.append(new_stamps[other_stamps[pos] == new_stamps] if len(other_stamps) else new_stamps[:0])
+    new_aligned = np.unique(np.concatenate(candidates))
+    if aligned.size:
+        new_aligned = new_aligned[new_aligned > aligned.view()[-1]]
+    aligned.append(new_aligned)
+
+    df_predictions = state['predictions'].frame()
+    day_index = dict(previous.prediction_day_index)
+    start, end = ranges['predictions']
+    for day, (day_start, day_end) in build_day_index(df_predictions.index[start:end]).items():
+        first = day_index[day][0] if day in day_index else start + day_start
+        day_index[day] = (first, start + day_end) # 新日期总在末尾，字典保持按日期排序
+
+    artifact_store, metric_rollup = refreshed_artifacts(previous, signature)
+    new_rows = sum(end - start for start, end in ranges.values())
+    snapshot = replace(
+        previous,
+        version=next(_snapshot_versions),
+        loaded_at=time.time(),
+        source_signature=signature,
+        df_predictions=df_predictions,
+        df_truth=state['truth'].frame(),
+        available_dates=list(day_index),
+        prediction_day_index=day_index,
+        overview_time_lookup={**previous.overview_time_lookup, 'epochs': aligned.view()},
+        csv_tails=tails,
+        metric_rollup=metric_rollup,
+        forecast_index=refreshed_forecasts(previous, signature),
+        artifacts=artifact_store,
+        append_state=state,
+    )
+    # 只追加了新行：/api/data 缓存键包含当天行数，未变化日期的缓存仍然有效；其余缓存键包含版本号，不会命中旧数据
+    publish_snapshot(snapshot, clear_cache=False)
+    DATA_LOAD_LATENCY.observe(time.perf_counter() - ingest_start, 'ingest')
+    RELOAD_STATS['ingests'] += 1
+    RELOAD_STATS['ingested_rows'] += new_rows
+    app.logger.info(f"--- [ingest] Appended {new_rows} rows, snapshot version {snapshot.version}.")
+    return snapshot
+
+
+def _changed_paths(previous, signature):
+    return [new[0] for new, old in zip(signature, previous.source_signature) if new != old]
+
+
+def refreshed_forecasts(previous, signature):
+    """预报批次目录变化时增量更新索引，否则沿用 previous 的索引。"""
+    if len(previous.source_signature) == len(signature) and forecast_runs_folder() not in _changed_paths(previous, signature):
+        return previous.forecast_index
+    return load_forecast_index(previous.forecast_index)
+
+
+def refreshed_artifacts(previous, signature):
+    """
+    预计算产物 manifest 变化时打开新产物，返回 (产物, 指标预聚合)；未变化时沿用 previous 的。
+    旧产物中行数已变化的日期在查找时按天回退为实时计算，因此追加数据后可继续使用。
+    """
+    if len(previous.source_signature) == len(signature) and artifact_manifest_path() not in _changed_paths(previous, signature):
+        return previous.artifacts, previous.metric_rollup
+    store = open_artifact_store(previous.station_names)
+    if store is not None and store['metric_rollup'] is not None:
+        return store, store['metric_rollup']
+    return store, previous.metric_rollup
+
+
+def _only_csvs_appended(previous, signature):
+    """
+    仅预测/实际 CSV 变大（其他文件未变，预计算产物 manifest 与预报批次可以变化）且当前快照可增量追加时返回 True。
+    """
+    if len(previous.source_signature) != len(signature) or len(previous.csv_tails) != 2:
+        return False
+    if previous.df_predictions.empty or previous.df_truth.empty or not previous.overview_time_lookup:
+        return False
+    csv_paths = {os.path.join(DATA_FOLDER, PREDICTION_FILENAME), os.path.join(DATA_FOLDER, TRUTH_FILENAME)}
+    for (path, size, mtime), (_, old_size, old_mtime) in zip(signature, previous.source_signature):
+        if (size, mtime) == (old_size, old_mtime) or path in (artifact_manifest_path(), forecast_runs_folder()):
+            continue
+        # 大小不变但 mtime 变化可能是原地改写（如修改历史值），只有变大才按追加处理
+        if path not in csv_paths or size is None or old_size is None or size <= old_size:
+            return False
+    return True
+
+
+def reload_if_changed():
+    """
+    数据文件有变化时更新数据：若只是预测/实际 CSV 末尾追加了新行则增量读取，
+    否则全量重新加载。若新数据加载失败（预测表为空）而当前快照可用，
+    则保留当前快照，避免用空数据覆盖。返回是否发布了新快照。
+    """
+    RELOAD_STATS['last_check'] = time.time()
+    if data_source_signature() == SNAPSHOT.source_signature:
+        return False
+    with _load_lock:
+        signature = data_source_signature()
+        if signature == SNAPSHOT.source_signature: # 其他线程可能已完成加载
+            return False
+        previous = SNAPSHOT
+        changed = _changed_paths(previous, signature)
+        if previous.station_names and changed and set(changed) <= {artifact_manifest_path(), forecast_runs_folder()}:
+            # 只有预计算产物或预报批次更新：只更新对应部分，数据表不变
+            artifact_store, metric_rollup = refreshed_artifacts(previous, signature)
+            publish_snapshot(replace(previous, version=next(_snapshot_versions), loaded_at=time.time(), source_signature=signature,
+                                     forecast_index=refreshed_forecasts(previous, signature),
+                                     artifacts=artifact_store, metric_rollup=metric_rollup))
+            app.logger.info(f"--- [hot_reload] Artifacts/forecast runs changed, snapshot version {SNAPSHOT.version}.")
+            return True
+        if _only_csvs_appended(previous, signature):
             try:
-                lon = geo_map.loc[station_name, 'longitude']
-                lat = geo_map.loc[station_name, 'latitude']
-                display_text = f"经:{lon:.2f}, 纬:{lat:.2f} (ID:光伏电站{index})"
-            except KeyError: # 处理列名不存在的情况
-                 app.logger.warning(f"--- [load_data RESTORED] Geo details KeyError for {station_name}. Columns: {list(geo_map.columns)}")
-                 display_text = f"光伏电站{index} (ID:{station_name}, 地理信息列缺失)"
+                if ingest_appended_rows(previous, signature) is not None:
+                    return True
             except Exception as e:
-                app.logger.warning(f"--- [load_data RESTORED] Error getting geo details for {station_name}: {e}")
-                display_text = f"光伏电站{index} (ID:{station_name}, 地理信息错误)"
+                app.logger.error(f"--- [ingest] Incremental ingest failed, falling back to full reload: {e}", exc_info=True)
+        app.logger.info(f"--- [hot_reload] Data files changed, reloading (current version {previous.version})...")
+        try:
+            snapshot = _load_data_locked()
+        except Exception as e:
+            RELOAD_STATS['failures'] += 1
+            RELOAD_STATS['last_error'] = str(e)
+            app.logger.error(f"--- [hot_reload] Reload failed: {e}", exc_info=True)
+            return False
+        if snapshot.df_predictions.empty and not previous.df_predictions.empty:
+            # 新快照从未发布；保留旧数据（版本号不变，缓存仍然有效），只记录新签名，避免对同一批坏文件反复重试
+            publish_snapshot(replace(previous, source_signature=snapshot.source_signature), clear_cache=False)
+            RELOAD_STATS['failures'] += 1
+            RELOAD_STATS['last_error'] = 'new prediction data is empty'
+            app.logger.error("--- [hot_reload] New prediction data is empty; keeping previous snapshot.")
+            return False
+        publish_snapshot(snapshot)
+        RELOAD_STATS['reloads'] += 1
+        app.logger.info(f"--- [hot_reload] Snapshot version {snapshot.version} published.")
+        return True
+
+
+def _reload_watcher_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_if_changed()
+        except Exception as e:
+            app.logger.error(f"--- [hot_reload] Watcher error: {e}", exc_info=True)
 
-        STATION_DISPLAY_INFO.append({'id': station_name, 'display': display_text})
-    app.logger.info(f"--- [load_data RESTORED] Station display info prepared: {len(STATION_DISPLAY_INFO)} items.")
 
+_watcher_pid = None
+
+
+def ensure_reload_watcher():
+    """
+    在当前进程中启动后台热加载线程（每个进程一次）。按 PID 判断，
+    因此 gunicorn --preload fork 出的 worker 会各自启动自己的线程。
+    """
+    global _watcher_pid
+    if HOT_RELOAD_INTERVAL_SECONDS <= 0 or _watcher_pid == os.getpid():
+        return
+    _watcher_pid = os.getpid()
+    threading.Thread(target=_reload_watcher_loop, args=(HOT_RELOAD_INTERVAL_SECONDS,),
+                     name='data-reload-watcher', daemon=True).start()
+    app.logger.info(f"--- [hot_reload] Watcher started, interval {HOT_RELOAD_INTERVAL_SECONDS}s.")
 
-    # --- 最终检查 ---
-    app.logger.info(f"--- [load_data RESTORED] Final check: df_predictions empty? {df_predictions.empty}")
-    app.logger.info(f"--- [load_data RESTORED] Final check: df_truth empty? {df_truth.empty}")
-    app.logger.info("--- [load_data RESTORED] Function End ---")
-    handler.flush() # 再次确保刷新
-    sys.stderr.flush()
+
+# --- 辅助函数：按时间戳取一行 ---
+def row_at(df, timestamp, columns):
+    """
+    在已排序的索引上二分定位 timestamp 所在行并返回指定列的 Series。
+    不使用 .loc，避免每个新快照首次查询时为整列索引构建哈希表。
+    """
+    pos = df.index.searchsorted(timestamp)
+    if pos >= len(df) or df.index[pos] != timestamp:
+        raise KeyError(timestamp)
+    return df.iloc[pos, df.columns.get_indexer(columns)]
 
 
 # --- 辅助函数：获取概览数据 ---
-def get_overview_data():
-    global df_predictions, df_truth, STATION_NAMES # 确保引用全局变量
-    app.logger.info("--- [get_overview_data] Function Start ---")
+def overview_colors(actual, predicted):
+    """误差预警颜色（数组版）：|实际 - 预测| < 1 为绿，<= 2 为黄，否则为红；缺值为灰。"""
+    diff = np.abs(np.asarray(actual, dtype=np.float64) - np.asarray(predicted, dtype=np.float64))
+    with np.errstate(invalid='ignore'):
+        return np.select([np.isnan(diff), diff < 1, diff <= 2], ['grey', 'green', 'yellow'], 'red')
+
+
+def overview_color(actual, predicted):
+    """单个站点的误差预警颜色，缺值（None/NaN）为灰。"""
+    actual, predicted = (np.nan if v is None else v for v in (actual, predicted))
+    return str(overview_colors([actual], [predicted])[0])
+
+
+def get_overview_data(snapshot=None, forecast=None):
+    """forecast 为 parse_forecast_selector() 的结果时，预测出力取自按其选出的预报批次。"""
+    snapshot = snapshot or SNAPSHOT # 整个函数只使用同一个快照
+    df_predictions, df_truth, STATION_NAMES = snapshot.df_predictions, snapshot.df_truth, snapshot.station_names
+    app.logger.debug("--- [get_overview_data] Function Start ---")
     overview_data = []
 
     # 再次检查全局 DataFrame 是否为空
@@ -228,7 +1009,7 @@ def get_overview_data():
         for i, station_id in enumerate(overview_stations, start=1):
             overview_data.append({
                 'id': station_id,
-                'name': f"光伏电站 {i}", # 使用序号名称
+                'name': station_display_name(i), # 使用序号名称
                 'actual': 'N/A',
                 'predicted': 'N/A',
                 'color': 'grey'
@@ -241,57 +1022,29 @@ def get_overview_data():
         time_difference = timedelta(hours=TIME_OFFSET_HOURS) # 创建 6 小时的时间差
         now_local_estimated = now_server + time_difference # 计算估算的本地时间
 
-        app.logger.info(f"--- [get_overview_data] Server time: {now_server.strftime('%Y-%m-%d %H:%M:%S')}")
-        app.logger.info(f"--- [get_overview_data] Applying +{TIME_OFFSET_HOURS} hours offset.")
-        app.logger.info(f"--- [get_overview_data] Estimated Local time: {now_local_estimated.strftime('%Y-%m-%d %H:%M:%S')}")
+        app.logger.debug("--- [get_overview_data] Server time: %s", now_server)
+        app.logger.debug("--- [get_overview_data] Applying +%s hours offset.", TIME_OFFSET_HOURS)
+        app.logger.debug("--- [get_overview_data] Estimated Local time: %s", now_local_estimated)
         # --- 使用估算的本地时间进行后续操作 ---
 
-        current_hm = now_local_estimated.strftime('%H:%M')
-        current_date = now_local_estimated.date()
-        app.logger.info(f"--- [get_overview_data] Using Date for filtering: {current_date}, Using Time (HH:MM) for filtering: {current_hm}")
+        app.logger.debug("--- [get_overview_data] Looking up latest aligned time point as of %s", now_local_estimated)
         # --- 时间修正结束 ---
 
-        # 查找最新的 <= current_hm 的时间点
-        # 确保索引是 DatetimeIndex
-        if not isinstance(df_predictions.index, pd.DatetimeIndex) or not isinstance(df_truth.index, pd.DatetimeIndex):
-             app.logger.error("--- [get_overview_data] ERROR: Predictions or Truth index is not DatetimeIndex!")
-             raise TypeError("DataFrame index must be DatetimeIndex for time comparison")
-
-        valid_times_pred_mask = df_predictions.index.strftime('%H:%M') <= current_hm
-        valid_times_truth_mask = df_truth.index.strftime('%H:%M') <= current_hm
-
-        valid_times_pred = df_predictions.index[valid_times_pred_mask]
-        valid_times_truth = df_truth.index[valid_times_truth_mask]
-
-        latest_time = pd.NaT
-
-        if not valid_times_pred.empty and not valid_times_truth.empty:
-             latest_time_pred = valid_times_pred.max()
-             latest_time_truth = valid_times_truth.max()
-             # 使用预测时间作为基准（假设两者时间戳对齐）
-             latest_time = latest_time_pred
-             # 检查真实数据在该时间点也存在
-             if latest_time not in df_truth.index:
-                 app.logger.warning(f"--- [get_overview_data] WARNING: Latest prediction time {latest_time} not found in truth data index. Trying truth max time.")
-                 latest_time = latest_time_truth # 尝试用真实数据的最大时间
-                 if latest_time not in df_predictions.index:
-                      app.logger.error(f"--- [get_overview_data] ERROR: Latest truth time {latest_time} also not in prediction index. Cannot find common time.")
-                      latest_time = pd.NaT # 回退到 NaT
-
-             if pd.notna(latest_time):
-                  app.logger.info(f"--- [get_overview_data] Found latest matching time point: {latest_time}")
-
+        # 在预计算的查找结构上二分查找最新的对齐时间点（优先当天，否则按一天中的时刻回放）
+        latest_time = find_latest_aligned_time(snapshot.overview_time_lookup, now_local_estimated)
+        if pd.notna(latest_time):
+            app.logger.debug("--- [get_overview_data] Found latest matching time point: %s", latest_time)
         else:
-             app.logger.warning(f"--- [get_overview_data] WARNING: No valid time points <= {current_hm} found in predictions or truth data.")
+            app.logger.warning(f"--- [get_overview_data] WARNING: No aligned time point found as of {now_local_estimated}.")
 
         # 根据 latest_time 获取数据
         if pd.notna(latest_time):
             target_stations = STATION_NAMES[:NUM_OVERVIEW_STATIONS] # 获取前 N 个站名
-            app.logger.debug(f"--- [get_overview_data] Getting data for stations: {target_stations} at time {latest_time}")
+            app.logger.debug("--- [get_overview_data] Getting data for stations: %s at time %s", target_stations, latest_time)
 
             # 尝试一次性获取所需行的所有列，可能更高效
             try:
-                actual_row = df_truth.loc[[latest_time], target_stations].iloc[0]
+                actual_row = row_at(df_truth, latest_time, target_stations)
             except KeyError:
                 app.logger.warning(f"--- [get_overview_data] KeyError getting actual row for time {latest_time} and stations {target_stations}.")
                 actual_row = pd.Series(index=target_stations, dtype=float) # 返回空 Series
@@ -300,7 +1053,7 @@ def get_overview_data():
                  actual_row = pd.Series(index=target_stations, dtype=float)
 
             try:
-                predicted_row = df_predictions.loc[[latest_time], target_stations].iloc[0]
+                predicted_row = row_at(df_predictions, latest_time, target_stations)
             except KeyError:
                 app.logger.warning(f"--- [get_overview_data] KeyError getting predicted row for time {latest_time} and stations {target_stations}.")
                 predicted_row = pd.Series(index=target_stations, dtype=float)
@@ -308,20 +1061,18 @@ def get_overview_data():
                  app.logger.warning(f"--- [get_overview_data] IndexError getting predicted row for time {latest_time}.")
                  predicted_row = pd.Series(index=target_stations, dtype=float)
 
+            if forecast is not None:
+                values, _ = forecast_values(snapshot, target_stations, np.array([latest_time.value]), forecast)
+                predicted_row = pd.Series(values[:, 0], index=target_stations)
 
             for i, station_id in enumerate(target_stations, start=1):
-                station_name = f"光伏电站 {i}"
-                actual_value = actual_row.get(station_id, np.nan) # 使用 .get 防止 KeyError
-                predicted_value = predicted_row.get(station_id, np.nan)
-                color = 'grey'
-
-                if pd.notna(actual_value) and pd.notna(predicted_value):
-                    diff = abs(actual_value - predicted_value)
-                    if diff < 1: color = 'green'
-                    elif diff <= 2: color = 'yellow'
-                    else: color = 'red'
-                else:
-                     app.logger.debug(f"--- [get_overview_data] Station {station_id} has NaN value at {latest_time}. Actual: {actual_value}, Predicted: {predicted_value}")
+                station_name = station_display_name(i)
+                # 使用 .get 防止 KeyError；float32 存储的值转回 4 位小数的 float，避免阈值边界上的精度误差
+                actual_value = round(float(actual_row.get(station_id, np.nan)), 4)
+                predicted_value = round(float(predicted_row.get(station_id, np.nan)), 4)
+                color = overview_color(actual_value, predicted_value)
+                if color == 'grey':
+                     app.logger.debug("--- [get_overview_data] Station %s has NaN value at %s. Actual: %s, Predicted: %s", station_id, latest_time, actual_value, predicted_value)
 
 
                 overview_data.append({
@@ -335,7 +1086,7 @@ def get_overview_data():
              app.logger.warning("--- [get_overview_data] No valid latest_time found. Returning N/A data.")
              overview_stations = STATION_NAMES[:NUM_OVERVIEW_STATIONS] if STATION_NAMES else [f'Placeholder_{i+1}' for i in range(NUM_OVERVIEW_STATIONS)]
              for i, station_id in enumerate(overview_stations, start=1):
-                overview_data.append({'id': station_id, 'name': f"光伏电站 {i}", 'actual': 'N/A', 'predicted': 'N/A', 'color': 'grey'})
+                overview_data.append({'id': station_id, 'name': station_display_name(i), 'actual': 'N/A', 'predicted': 'N/A', 'color': 'grey'})
 
     except Exception as e:
         app.logger.error(f"--- [get_overview_data] Unexpected error: {e}", exc_info=True)
@@ -343,79 +1094,872 @@ def get_overview_data():
         overview_data = []
         overview_stations = STATION_NAMES[:NUM_OVERVIEW_STATIONS] if STATION_NAMES else [f'Placeholder_{i+1}' for i in range(NUM_OVERVIEW_STATIONS)]
         for i, station_id in enumerate(overview_stations, start=1):
-             overview_data.append({'id': station_id, 'name': f"光伏电站 {i}", 'actual': '错误', 'predicted': '错误', 'color': 'grey'})
+             overview_data.append({'id': station_id, 'name': station_display_name(i), 'actual': '错误', 'predicted': '错误', 'color': 'grey'})
 
-    app.logger.info(f"--- [get_overview_data] Function End. Returning {len(overview_data)} items.")
+    app.logger.debug("--- [get_overview_data] Function End. Returning %d items.", len(overview_data))
     return overview_data
 
 
+
+# --- 概览实时推送：每个间隔只计算一次，结果分发给所有订阅者 ---
+def current_overview_time(snapshot):
+    """按服务器时间加偏移量估算的本地时间，概览当前应展示的对齐时间点（找不到时为 NaT）。"""
+    now_local = datetime.now() + timedelta(hours=TIME_OFFSET_HOURS)
+    return find_latest_aligned_time(snapshot.overview_time_lookup, now_local)
+
+
+def overview_key(snapshot):
+    """概览数据的键 (快照版本, 当前应展示的时间点)，键不变则概览不变。"""
+    latest_time = current_overview_time(snapshot)
+    return snapshot.version, (latest_time.value if pd.notna(latest_time) else None)
+
+
+@dataclass(frozen=True)
+class OverviewState:
+    key: tuple
+    event_id: str # 内容哈希，各 worker 之间一致，可用作 SSE 的 Last-Event-ID
+    data: list
+    message: bytes # 预先编码好的 SSE 消息，所有订阅者共享
+
+
+class OverviewBroadcaster:
+    """
+    概览数据的单点计算与广播。只有进入新的 15 分钟间隔或发布新快照（键变化）时
+    才调用一次 get_overview_data()，内容有变化才唤醒订阅者。订阅者只在条件变量上
+    等待并发送预先编码好的消息，本身不做任何计算，因此连接数多时开销也很小。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._compute_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._publisher_pid = None
+        self.state = None
+        self.subscribers = 0
+
+    def refresh(self):
+        """键变化时重新计算概览，返回当前的 OverviewState。"""
+        state = self.state
+        key = overview_key(SNAPSHOT)
+        if state is not None and state.key == key:
+            return state
+        with self._compute_lock:
+            state = self.state
+            key = overview_key(SNAPSHOT)
+            if state is not None and state.key == key: # 其他线程已完成计算
+                return state
+            data = get_overview_data()
+            OVERVIEW_COMPUTATIONS.inc()
+            body = app.json.dumps(data, ensure_ascii=False)
+            event_id = hashlib.md5(body.encode('utf-8')).hexdigest()[:16]
+            message = f"id: {event_id}\nevent: overview\ndata: {body}\n\n".encode('utf-8')
+            changed = state is None or state.event_id != event_id
+            state = OverviewState(key=key, event_id=event_id, data=data, message=message)
+            with self._cond:
+                self.state = state
+                if changed:
+                    self._cond.notify_all()
+            if changed:
+                app.logger.info(f"--- [overview_stream] New overview {event_id} for key {key}, {self.subscribers} subscriber(s).")
+        return state
+
+    def wait(self, last_event_id, timeout):
+        """等待 event_id 不同于 last_event_id 的概览，超时返回 None。"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.state is not None and self.state.event_id != last_event_id, timeout)
+            state = self.state
+        return state if state is not None and state.event_id != last_event_id else None
+
+    def add_subscriber(self, delta=1):
+        with self._cond:
+            self.subscribers += delta
+
+    def wake(self):
+        self._wake.set()
+
+    def ensure_publisher(self):
+        """在当前进程中启动推送线程（每个进程一次，与热加载线程相同按 PID 判断）。"""
+        if self._publisher_pid == os.getpid():
+            return
+        self._publisher_pid = os.getpid()
+        threading.Thread(target=self._publisher_loop, name='overview-publisher', daemon=True).start()
+        app.logger.info("--- [overview_stream] Publisher started.")
+
+    def _publisher_loop(self):
+        while True:
+            # 睡到下一个间隔边界（稍后一点，确保新时间点已经 <= now），或被新快照唤醒
+            self._wake.wait(OVERVIEW_INTERVAL_SECONDS - time.time() % OVERVIEW_INTERVAL_SECONDS + 0.5)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                app.logger.error(f"--- [overview_stream] Refresh failed: {e}", exc_info=True)
+
+
+OVERVIEW_BROADCASTER = OverviewBroadcaster()
+
+# --- 辅助函数：构建单站单日图表数据 ---
+def build_daily_station_payload(snapshot, station_id, date_str, target_date):
+    # 通过预计算的行偏移索引直接定位当天数据，只切片单列，不复制整表
+    df_predictions = snapshot.df_predictions
+    day_range = snapshot.prediction_day_index.get(target_date.strftime('%Y-%m-%d'))
+    col_pos = snapshot.station_column_pos.get(station_id)
+
+    if day_range is None or col_pos is None:
+        app.logger.warning(f"--- [API /api/data/{station_id}/{date_str}] No data found for date or column missing.")
+        return {"station": station_id, "date": date_str, "timestamps": [], "predictions": [], "message": f"站点 '{station_id}' 在日期 '{date_str}' 没有预测数据"}
+
+    start, end = day_range
+    app.logger.debug("--- [API /api/data/%s/%s] Row range: [%d, %d)", station_id, date_str, start, end)
+    # 二进制存储为 float32，转回 float64 并保留 4 位小数，避免 JSON 中出现 2.4000000953674316
+    prediction_data = np.round(df_predictions.iloc[start:end, col_pos].to_numpy(dtype=np.float64), 4).tolist()
+    timestamps = df_predictions.index[start:end].strftime('%H:%M:%S').tolist()
+    app.logger.debug("--- [API /api/data/%s/%s] Data found. Returning %d timestamps.", station_id, date_str, len(timestamps))
+    return {"station": station_id, "date": date_str, "timestamps": timestamps, "predictions": prediction_data}
+
+
+# --- 辅助函数：多批次预报查询 ---
+def parse_forecast_selector(args):
+    """
+    解析预报批次选择参数：issue_time（只使用该时刻及之前发布的预报，'YYYY-MM-DD HH:MM[:SS]' 或 ISO 格式）
+    与 horizon（提前量下限，小时，如 24 为日前预报、0 为最新滚动预报）。两者同时给出时同时生效，
+    都未给出时返回 None（使用最终预测值）。格式错误或超出范围时抛出 ValueError。
+    """
+    issue_time, horizon = args.get('issue_time'), args.get('horizon')
+    if issue_time is None and horizon is None:
+        return None
+    selector = {'issue_time': None, 'horizon_hours': None}
+    if issue_time is not None:
+        selector['issue_time'] = pd.Timestamp(datetime.fromisoformat(issue_time))
+    if horizon is not None:
+        selector['horizon_hours'] = float(horizon)
+        if not 0 <= selector['horizon_hours'] <= MAX_FORECAST_HORIZON_HOURS: # NaN 也不满足
+            raise ValueError(f"horizon out of range: {horizon}")
+    return selector
+
+
+def describe_forecast_selector(selector):
+    return {
+        "issue_time": selector['issue_time'].strftime('%Y-%m-%d %H:%M:%S') if selector['issue_time'] is not None else None,
+        "horizon_hours": selector['horizon_hours'],
+    }
+
+
+def forecast_values(snapshot, stations, target_ns, selector):
+    """
+    各站点在 target_ns（int64 纳秒数组）上按 selector 选出的预报值，以及所用批次的发布时间
+    （int64 纳秒，没有符合条件的批次时为 -1），形状均为 (站点数, 目标数)。
+    批次中缺少某站点时，该站点回退到更早的批次，见 forecasts.select()。
+    """
+    issue_ns = selector['issue_time'].value if selector['issue_time'] is not None else None
+    asof = forecasts.as_of(target_ns, issue_ns, selector['horizon_hours'])
+    return forecasts.select(snapshot.forecast_index, stations, target_ns, asof)
+
+
+def build_forecast_station_payload(snapshot, station_id, date_str, target_date, selector):
+    """/api/data 指定 issue_time/horizon 时：当天各目标时间按 selector 选出的预报值及其发布时间。"""
+    day_start = pd.Timestamp(target_date)
+    targets = snapshot.forecast_index['targets']
+    targets = targets[np.searchsorted(targets, day_start.value):np.searchsorted(targets, (day_start + pd.Timedelta(days=1)).value)]
+    values, issued = forecast_values(snapshot, [station_id], targets, selector)
+    found = issued[0] >= 0
+    targets, values, issued = targets[found], values[0, found], issued[0, found]
+    payload = {
+        "station": station_id,
+        "date": date_str,
+        "timestamps": pd.DatetimeIndex(targets.view('datetime64[ns]')).strftime('%H:%M:%S').tolist(),
+        "predictions": to_json_values(values),
+        "issue_times": pd.DatetimeIndex(issued.view('datetime64[ns]')).strftime('%Y-%m-%d %H:%M:%S').tolist(),
+        **describe_forecast_selector(selector),
+    }
+    if not len(targets):
+        app.logger.warning(f"--- [API /api/data/{station_id}/{date_str}] No forecast run matches {describe_forecast_selector(selector)}.")
+        payload["message"] = f"站点 '{station_id}' 在日期 '{date_str}' 没有符合条件的预报批次"
+    return payload
+
+
+# --- 辅助函数：多站点、多日范围数据 ---
+def parse_range_bound(value, is_end):
+    """
+    解析 /api/range 的 start/end 参数（'YYYY-MM-DD' 或 'YYYY-MM-DD HH:MM[:SS]'，也接受 ISO 'T' 分隔）。
+    end 为包含端，只给日期时包含当天全部数据。数据时间戳为不带时区的本地时间，因此不接受时区偏移。
+    格式错误、带时区或超出纳秒时间戳范围（1677-2262 年）时抛出 ValueError。
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        raise ValueError(f"Timezone offsets are not supported: {value}")
+    try:
+        ts = pd.Timestamp(parsed).as_unit('ns')
+        if is_end and len(value) == 10:
+            ts = ts + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+    except (OverflowError, pd.errors.OutOfBoundsDatetime) as e:
+        raise ValueError(f"Timestamp out of range: {value}") from e
+    return ts
+
+
+def to_json_values(values):
+    """float 数组 -> 保留 4 位小数的列表，NaN 转为 null（标准 JSON 不支持 NaN）。"""
+    values = np.round(np.asarray(values, dtype=np.float64), 4)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def take_range(df, column_positions, timestamps):
+    """
+    取 df 中位于 timestamps 的行、column_positions 的列（-1 表示该表没有此站点）。
+    timestamps 为已排序的 int64 纳秒数组；df 中不存在的时间点填 NaN。
+    返回形状 (站点数, len(timestamps)) 的 float64 数组。
+    """
+    result = np.full((len(column_positions), len(timestamps)), np.nan)
+    stamps = df.index.asi8
+    if len(stamps) == 0 or len(timestamps) == 0:
+        return result
+    lo = np.searchsorted(stamps, timestamps[0], side='left')
+    hi = np.searchsorted(stamps, timestamps[-1], side='right')
+    window = stamps[lo:hi]
+    pos = np.searchsorted(window, timestamps).clip(max=max(len(window) - 1, 0))
+    found = np.flatnonzero(window[pos] == timestamps) if len(window) else np.empty(0, dtype=int)
+    valid_cols = [i for i, c in enumerate(column_positions) if c >= 0]
+    if len(found) and valid_cols:
+        block = df.iloc[lo:hi, [column_positions[i] for i in valid_cols]].to_numpy(dtype=np.float64)
+        result[np.ix_(valid_cols, found)] = block[pos[found]].T
+    return result
+
+
+def build_range_payload(snapshot, stations, start, end):
+    """
+    多站点、多日的预测值与实际值，列式返回：共享的时间戳数组 + 每个站点一个数值数组。
+    时间戳为预测与实际时间点的并集，某一方缺失的点为 null。
+    """
+    df_predictions, df_truth = snapshot.df_predictions, snapshot.df_truth
+    stamp_sets = []
+    for df in (df_predictions, df_truth):
+        stamps = df.index.asi8
+        lo = np.searchsorted(stamps, start.value, side='left')
+        hi = np.searchsorted(stamps, end.value, side='right')
+        stamp_sets.append(stamps[lo:hi])
+    timestamps = np.union1d(*stamp_sets)
+
+    pred_cols = [snapshot.station_column_pos[s] for s in stations]
+    truth_cols = df_truth.columns.get_indexer(stations).tolist() if not df_truth.empty else [-1] * len(stations)
+    predictions = take_range(df_predictions, pred_cols, timestamps)
+    truth = take_range(df_truth, truth_cols, timestamps)
+    return {
+        "stations": stations,
+        "start": start.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end.strftime('%Y-%m-%d %H:%M:%S'),
+        "timestamps": pd.DatetimeIndex(timestamps.view('datetime64[ns]')).strftime('%Y-%m-%d %H:%M:%S').tolist(),
+        "predictions": {s: to_json_values(predictions[i]) for i, s in enumerate(stations)},
+        "truth": {s: to_json_values(truth[i]) for i, s in enumerate(stations)},
+    }
+
+
+# --- 辅助函数：降采样 ---
+def station_major(df):
+    """DataFrame 的数值按站点连续视图，形状 (站点数, 行数)。"""
+    return df.to_numpy().T
+
+
+def build_table_rollups(df):
+    """为一张表构建各级预聚合；covered_until 之后增量追加的行在查询时按原始行处理。"""
+    stamps = df.index.asi8
+    values = station_major(df)
+    result = {level: downsample.build_rollup(stamps, values, period_ns)
+              for level, period_ns in downsample.ROLLUP_LEVELS.items()}
+    result['covered_until'] = int(stamps[-1])
+    return result
+
+
+def table_segments(df, rollups, rows, start_ns, end_ns, level):
+    """
+    [start_ns, end_ns] 范围内指定站点的段：完整落在范围内的时间段直接取预聚合，
+    两端不足一个时间段的部分以及预聚合之后追加的行使用原始数据。
+    """
+    stamps = df.index.asi8
+    values = station_major(df)
+
+    def raw(lo_ns, hi_ns): # 原始行 [lo_ns, hi_ns]
+        lo = np.searchsorted(stamps, lo_ns, side='left')
+        hi = np.searchsorted(stamps, hi_ns, side='right')
+        return downsample.raw_segments(stamps[lo:hi], values[rows, lo:hi])
+
+    rollup = rollups.get(level) if level in downsample.ROLLUP_LEVELS else None
+    if rollup is None:
+        return downsample.concat_segments([raw(start_ns, end_ns)])
+    period_ns = downsample.ROLLUP_LEVELS[level]
+    periods = rollup['period']
+    p_lo = np.searchsorted(periods, start_ns, side='left')
+    p_hi = np.searchsorted(periods, end_ns - period_ns + 1, side='right')
+    if p_lo >= p_hi:
+        return downsample.concat_segments([raw(start_ns, end_ns)])
+    rolled_until = rollups['covered_until'] if p_hi == len(periods) else periods[p_hi - 1] + period_ns - 1
+    return downsample.concat_segments([
+        raw(start_ns, periods[p_lo] - 1),
+        downsample.select_segments(rollup, rows, p_lo, p_hi),
+        raw(rolled_until + 1, end_ns),
+    ])
+
+
+def build_downsampled_range_payload(snapshot, stations, start, end, points):
+    """
+    与 build_range_payload 相同的列式结构，但按固定时间宽度分桶，每桶输出最小/最大两个点，
+    总点数不超过 points。桶宽不小于一小时/一天时直接使用对应的预聚合。
+    """
+    n_buckets = max(points // 2, 1)
+    bucket_ns = -(-(end.value - start.value + 1) // n_buckets) # 向上取整
+    level = 'day' if bucket_ns >= downsample.DAY_NS else 'hour' if bucket_ns >= downsample.HOUR_NS else 'raw'
+    # 桶边界与所用预聚合的时间段对齐（原始数据按 15 分钟对齐），这样每个时间段完整落在一个桶内
+    align_ns = downsample.ROLLUP_LEVELS.get(level, downsample.RAW_ALIGN_NS)
+    origin = start.value - start.value % align_ns
+    bucket_ns = -(-(end.value - origin + 1) // n_buckets)
+    bucket_ns = -(-bucket_ns // align_ns) * align_ns
+
+    results = {}
+    for key, df, cols in (('predictions', snapshot.df_predictions, [snapshot.station_column_pos[s] for s in stations]),
+                          ('truth', snapshot.df_truth, snapshot.df_truth.columns.get_indexer(stations).tolist() if not snapshot.df_truth.empty else [-1] * len(stations))):
+        valid = [i for i, c in enumerate(cols) if c >= 0]
+        segments = None
+        if valid and not df.empty:
+            segments = table_segments(df, snapshot.rollups.get(key, {}), [cols[i] for i in valid], start.value, end.value, level)
+        results[key] = (valid, downsample.minmax_buckets(segments, origin, bucket_ns) if segments else None)
+
+    bucket_ids = np.union1d(*[r[1][0] if r[1] else np.empty(0, dtype=np.int64) for r in results.values()])
+    # 每桶两个点，时间取桶内（两张表中）第一个与最后一个样本的时间，因此总在 [start, end] 与数据范围之内；
+    # 各站点极值的确切时间不同，共用的时间轴无法逐站点给出，两点的值按出现顺序排列
+    first_ns = np.full(len(bucket_ids), np.iinfo(np.int64).max)
+    last_ns = np.full(len(bucket_ids), np.iinfo(np.int64).min)
+    for _, buckets in results.values():
+        if buckets is not None:
+            pos = np.searchsorted(bucket_ids, buckets[0])
+            first_ns[pos] = np.minimum(first_ns[pos], buckets[3])
+            last_ns[pos] = np.maximum(last_ns[pos], buckets[4])
+    timestamps = np.empty(2 * len(bucket_ids), dtype=np.int64)
+    timestamps[0::2] = first_ns
+    timestamps[1::2] = last_ns
+
+    payload = {
+        "stations": stations,
+        "start": start.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end.strftime('%Y-%m-%d %H:%M:%S'),
+        "timestamps": pd.DatetimeIndex(timestamps.view('datetime64[ns]')).strftime('%Y-%m-%d %H:%M:%S').tolist(),
+        "downsample": {"method": "minmax", "bucket_seconds": bucket_ns / 1e9, "source": level},
+    }
+    for key, (valid, buckets) in results.items():
+        values = np.full((len(stations), len(timestamps)), np.nan)
+        if buckets is not None:
+            ids, first, second = buckets[:3]
+            pos = np.searchsorted(bucket_ids, ids)
+            values[np.ix_(valid, 2 * pos)] = first
+            values[np.ix_(valid, 2 * pos + 1)] = second
+        payload[key] = {s: to_json_values(values[i]) for i, s in enumerate(stations)}
+    return payload
+
+
+# --- 辅助函数：预测精度指标 ---
+METRIC_GROUPS = ('total', 'day', 'hour_of_day')
+METRIC_NAMES = ('count', 'mae', 'rmse', 'mape', 'bias', 'nmae', 'nrmse')
+
+
+def aligned_rows(df_predictions, df_truth, stations, stamps):
+    """
+    返回 load_stations(lo, hi) 函数：取 stations[lo:hi] 在 stamps（两张表都存在的时间点）上的
+    (预测, 实际) 数组，形状 (站点数, len(stamps))。实际表中没有的站点为 NaN。
+    """
+    pred_cols = df_predictions.columns.get_indexer(stations)
+    truth_cols = df_truth.columns.get_indexer(stations)
+
+    def load_stations(lo, hi):
+        return (take_range(df_predictions, pred_cols[lo:hi].tolist(), stamps),
+                take_range(df_truth, truth_cols[lo:hi].tolist(), stamps))
+    return load_stations
+
+
+def build_metric_rollup(df_predictions, df_truth, df_geo, stations, aligned_epochs):
+    """加载时一次向量化计算全部站点的指标部分和；geo 文件有 capacity 列时用作装机容量。"""
+    capacity = None
+    if not df_geo.empty and 'capacity' in df_geo.columns:
+        capacity = pd.to_numeric(df_geo.set_index('station_id_str')['capacity'], errors='coerce').reindex(stations).to_numpy()
+    return metrics.build_rollup(aligned_epochs, len(stations),
+                                aligned_rows(df_predictions, df_truth, stations, aligned_epochs), capacity)
+
+
+def build_metrics_payload(snapshot, stations, start, end, group):
+    """指定站点在 [start, end] 内按 group 汇总的精度指标，列式返回。"""
+    rollup = snapshot.metric_rollup
+    rows = [snapshot.station_column_pos[s] for s in stations]
+    epochs = snapshot.overview_time_lookup['epochs'] # 包含增量追加的对齐时间点
+
+    def raw_rows(lo_ns, hi_ns):
+        stamps = epochs[np.searchsorted(epochs, lo_ns, side='left'):np.searchsorted(epochs, hi_ns, side='right')]
+        return (stamps, *aligned_rows(snapshot.df_predictions, snapshot.df_truth, stations, stamps)(0, len(stations)))
+
+    hour_start, sums = metrics.range_hourly_sums(rollup, rows, start.value, end.value, raw_rows, total=group == 'total')
+    keys, grouped = metrics.group_sums(hour_start, sums, group)
+    values = metrics.finalize(grouped, rollup['capacity'][rows])
+
+    payload = {
+        "stations": stations,
+        "start": start.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end.strftime('%Y-%m-%d %H:%M:%S'),
+        "group": group,
+        "capacity": dict(zip(stations, to_json_values(rollup['capacity'][rows]))),
+        "mape_min_capacity_fraction": metrics.MAPE_MIN_CAPACITY_FRACTION,
+    }
+    if group == 'total':
+        payload["metrics"] = {name: dict(zip(stations, to_json_values(values[name][:, 0]))) for name in METRIC_NAMES}
+    else:
+        if group == 'day':
+            payload["keys"] = pd.DatetimeIndex(keys.view('datetime64[ns]')).strftime('%Y-%m-%d').tolist()
+        else:
+            payload["keys"] = keys.tolist()
+        payload["metrics"] = {name: {s: to_json_values(values[name][i]) for i, s in enumerate(stations)} for name in METRIC_NAMES}
+    return payload
+
+
+# --- 辅助函数：地图查询（站点坐标 + 当前概览值）---
+def current_values(snapshot, positions, latest_time):
+    """站点（station_names 下标）在 latest_time 的 (实际, 预测) 出力，float64 数组，缺失为 NaN。"""
+    stations = [snapshot.station_names[p] for p in positions]
+    if pd.isna(latest_time):
+        return np.full(len(stations), np.nan), np.full(len(stations), np.nan)
+    stamps = np.array([latest_time.value], dtype=np.int64)
+    truth_cols = snapshot.df_truth.columns.get_indexer(stations).tolist() if not snapshot.df_truth.empty else [-1] * len(stations)
+    actual = take_range(snapshot.df_truth, truth_cols, stamps)[:, 0]
+    predicted = take_range(snapshot.df_predictions, list(positions), stamps)[:, 0]
+    return np.round(actual, 4), np.round(predicted, 4)
+
+
+def geo_station_records(snapshot, rows, latest_time, distances=None):
+    """
+    空间索引中 rows 行对应的站点，附带当前时间点的实际/预测出力与误差预警颜色。
+    出力为数值（缺失为 null），与概览页使用同一时间点和同一颜色规则。
+    """
+    index = snapshot.spatial_index
+    positions = index['positions'][rows]
+    actual, predicted = current_values(snapshot, positions, latest_time)
+    colors = overview_colors(actual, predicted).tolist()
+    actual, predicted = to_json_values(actual), to_json_values(predicted)
+    elevation = to_json_values(snapshot.station_coords['elevation'][positions])
+    records = []
+    for i, position in enumerate(positions):
+        record = {
+            'id': snapshot.station_names[position],
+            'name': station_display_name(position + 1),
+            'longitude': float(index['lon'][rows[i]]),
+            'latitude': float(index['lat'][rows[i]]),
+            'elevation': elevation[i],
+            'actual': actual[i],
+            'predicted': predicted[i],
+            'color': colors[i],
+        }
+        if distances is not None:
+            record['distance_km'] = round(float(distances[i]), 3)
+        records.append(record)
+    return records
+
+
+def geo_clusters(snapshot, rows, bbox, grid, latest_time):
+    """矩形内站点按 grid × grid 网格聚合：站点数、平均坐标、出力合计与各预警颜色的站点数。"""
+    index = snapshot.spatial_index
+    groups, cells = spatial.cluster_rows(index, rows, bbox, grid)
+    if not groups:
+        return []
+    rows = np.concatenate(groups)
+    starts = np.cumsum([0] + [len(g) for g in groups[:-1]])
+    actual, predicted = current_values(snapshot, index['positions'][rows], latest_time)
+    colors = overview_colors(actual, predicted)
+    sums = {}
+    for key, values in (('longitude', index['lon'][rows]), ('latitude', index['lat'][rows]),
+                        ('actual', np.nan_to_num(actual)), ('predicted', np.nan_to_num(predicted)),
+                        ('actual_count', ~np.isnan(actual)), ('predicted_count', ~np.isnan(predicted))):
+        sums[key] = np.add.reduceat(values.astype(np.float64), starts)
+    color_counts = {c: np.add.reduceat((colors == c).astype(np.int64), starts) for c in ('green', 'yellow', 'red', 'grey')}
+    counts = np.array([len(g) for g in groups])
+    return [{
+        'cell': int(cells[i]),
+        'count': int(counts[i]),
+        'longitude': round(float(sums['longitude'][i] / counts[i]), 6),
+        'latitude': round(float(sums['latitude'][i] / counts[i]), 6),
+        'actual_total': round(float(sums['actual'][i]), 4) if sums['actual_count'][i] else None,
+        'predicted_total': round(float(sums['predicted'][i]), 4) if sums['predicted_count'][i] else None,
+        'colors': {c: int(v[i]) for c, v in color_counts.items() if v[i]},
+    } for i in range(len(groups))]
+
+
+def parse_bbox(value):
+    """'最小经度,最小纬度,最大经度,最大纬度' -> 4 元组；格式或范围不合法时抛出 ValueError。"""
+    parts = [float(v) for v in value.split(',')]
+    if len(parts) != 4 or not all(np.isfinite(parts)):
+        raise ValueError(value)
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError(value)
+    return min_lon, min_lat, max_lon, max_lat
+
+
 # --- 路由定义 ---
 
-# 一级页面：概览页
+@app.before_request
+def _start_reload_watcher():
+    ensure_reload_watcher()
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request_latency(response):
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched' # 用路由模板作标签，避免基数爆炸
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route, request.method, str(response.status_code))
+    return response
+
+
+# Prometheus 格式的运行指标（按进程统计）
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(METRICS_REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+# 数据快照与热加载状态
+@app.route('/api/status')
+def data_status():
+    snapshot = SNAPSHOT
+    return jsonify({
+        "snapshot_version": snapshot.version,
+        "loaded_at": datetime.fromtimestamp(snapshot.loaded_at).isoformat(timespec='seconds') if snapshot.loaded_at else None,
+        "load_seconds": round(snapshot.load_seconds, 4),
+        "stations": len(snapshot.station_names),
+        "dates": len(snapshot.available_dates),
+        "hot_reload_interval_seconds": HOT_RELOAD_INTERVAL_SECONDS,
+        "reloads": RELOAD_STATS['reloads'],
+        "ingests": RELOAD_STATS['ingests'],
+        "ingested_rows": RELOAD_STATS['ingested_rows'],
+        "reload_failures": RELOAD_STATS['failures'],
+        "last_reload_error": RELOAD_STATS['last_error'],
+        "overview_subscribers": OVERVIEW_BROADCASTER.subscribers,
+        "artifacts_run": snapshot.artifacts['run'] if snapshot.artifacts is not None else None,
+        "forecast_runs": len(snapshot.forecast_index['issue_times']) if snapshot.forecast_index is not None else 0,
+    })
+
+# 一级页面：概览页（可选 issue_time / horizon 参数，含义同 /api/data）
 @app.route('/')
 def landing_page():
-    app.logger.info("--- [Route /] Request received ---")
-    overview_data = get_overview_data()
-    app.logger.debug(f"--- [Route /] Data for template: {overview_data}")
-    return render_template('landing.html', overview_data=overview_data)
+    app.logger.debug("--- [Route /] Request received ---")
+    try:
+        forecast = parse_forecast_selector(request.args)
+    except ValueError:
+        return f"无效的 issue_time 或 horizon 参数（horizon 范围 0-{MAX_FORECAST_HORIZON_HOURS} 小时）", 400
+    if forecast is None:
+        overview_data = OVERVIEW_BROADCASTER.refresh().data # 与 SSE 推送共享同一份计算结果
+    else:
+        overview_data = get_overview_data(SNAPSHOT, forecast) # 指定预报批次时单独计算，且不订阅实时推送
+    app.logger.debug("--- [Route /] Data for template: %s", overview_data)
+    return render_template('landing.html', overview_data=overview_data,
+                           forecast=describe_forecast_selector(forecast) if forecast is not None else None)
+
+# 概览实时推送 (Server-Sent Events)
+# 每个连接在等待期间占用一个 worker 线程/协程，连接数多时应使用异步或多线程 worker 部署，
+# 例如 gunicorn -k gevent 或 gunicorn -k gthread --threads 200。
+@app.route('/api/overview/stream')
+def overview_stream():
+    last_event_id = request.headers.get('Last-Event-ID')
+    app.logger.info("--- [API /api/overview/stream] Subscriber connected (Last-Event-ID: %s) ---", last_event_id)
+    OVERVIEW_BROADCASTER.ensure_publisher()
+    OVERVIEW_BROADCASTER.refresh()
+
+    def events():
+        sent = last_event_id
+        deadline = time.monotonic() + OVERVIEW_STREAM_MAX_SECONDS
+        OVERVIEW_BROADCASTER.add_subscriber()
+        try:
+            yield f"retry: {OVERVIEW_STREAM_RETRY_MS}\n\n".encode('utf-8')
+            while time.monotonic() < deadline:
+                state = OVERVIEW_BROADCASTER.wait(sent, OVERVIEW_STREAM_HEARTBEAT_SECONDS)
+                if state is None:
+                    yield b": keepalive\n\n" # 保活，同时让服务器及时发现已断开的连接
+                else:
+                    sent = state.event_id
+                    yield state.message
+        finally:
+            OVERVIEW_BROADCASTER.add_subscriber(-1)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # 二级页面：详情页
 @app.route('/details/<path:station_id>', methods=['GET'], endpoint='details_page')
 def details_page(station_id):
-    app.logger.info(f"--- [Route /details/{station_id}] Request received ---")
-    # 使用全局的 STATION_NAMES 进行验证
-    if station_id not in STATION_NAMES:
+    app.logger.debug("--- [Route /details/%s] Request received ---", station_id)
+    snapshot = SNAPSHOT
+    # 使用当前快照的站点 -> 位置映射进行验证（字典查找，不扫描列表）
+    pos = snapshot.station_column_pos.get(station_id)
+    if pos is None:
         app.logger.error(f"--- [Route /details/{station_id}] Invalid station ID requested.")
         return "无效的电站 ID", 404
 
-    # 使用全局的 STATION_DISPLAY_INFO 和 AVAILABLE_DATES
-    app.logger.debug(f"--- [Route /details/{station_id}] Rendering details template.")
+    # 页面只渲染当前站点一个选项，其余选项由下拉菜单通过 /api/stations 按需分页加载
+    app.logger.debug("--- [Route /details/%s] Rendering details template.", station_id)
     return render_template('details.html',
-                           station_info=STATION_DISPLAY_INFO, # 用于下拉菜单
-                           dates=AVAILABLE_DATES,
+                           selected_station=snapshot.station_display_info[pos],
+                           station_count=len(snapshot.station_names),
+                           station_page_size=STATION_PAGE_SIZE,
+                           dates=snapshot.available_dates,
                            selected_station_id=station_id)
 
+
+# API 路由 (站点列表：分页，可按站点 ID 或名称前缀搜索，供详情页下拉菜单按需加载)
+# 例: /api/stations?q=power1&offset=0&limit=50
+@app.route('/api/stations')
+def list_stations():
+    snapshot = SNAPSHOT
+    prefix = request.args.get('q', '').strip()
+    # 不给默认值：参数存在但无法解析时 get() 返回 None，据此返回 400 而不是静默使用默认值
+    offset = request.args.get('offset', type=int)
+    limit = request.args.get('limit', type=int)
+    app.logger.debug("--- [API /api/stations] Request received: q=%s, offset=%s, limit=%s", prefix, offset, limit)
+    if 'offset' in request.args and (offset is None or offset < 0):
+        return jsonify({"error": "offset 必须是非负整数"}), 400
+    if 'limit' in request.args and (limit is None or not 1 <= limit <= MAX_STATION_PAGE_SIZE):
+        return jsonify({"error": f"limit 必须是 1 到 {MAX_STATION_PAGE_SIZE} 之间的整数"}), 400
+    offset = 0 if offset is None else offset
+    limit = STATION_PAGE_SIZE if limit is None else limit
+
+    def build_payload():
+        if prefix:
+            matches = search_stations(snapshot.station_search_index, prefix)
+            total, page = len(matches), matches[offset:offset + limit].tolist()
+        else:
+            total = len(snapshot.station_names)
+            page = range(offset, min(offset + limit, total))
+        return {"query": prefix, "total": total, "offset": offset, "limit": limit,
+                "stations": [snapshot.station_display_info[i] for i in page]}
+
+    return make_cached_json_response(('stations', prefix, offset, limit, snapshot.version), build_payload)
+
+# API 路由 (地图视窗：矩形范围内的站点及当前出力；站点过多时按网格聚合)
+# 例: /api/geo/stations?bbox=105,32,112,40&max_points=500&grid=8
+@app.route('/api/geo/stations')
+def get_geo_stations():
+    snapshot = SNAPSHOT
+    app.logger.debug("--- [API /api/geo/stations] Request received: %s", request.args)
+    try:
+        bbox = parse_bbox(request.args.get('bbox', ''))
+    except ValueError:
+        return jsonify({"error": "bbox 格式应为 最小经度,最小纬度,最大经度,最大纬度"}), 400
+    max_points = request.args.get('max_points', type=int)
+    grid = request.args.get('grid', type=int)
+    if 'max_points' in request.args and (max_points is None or not 1 <= max_points <= MAX_GEO_POINTS):
+        return jsonify({"error": f"max_points 必须是 1 到 {MAX_GEO_POINTS} 之间的整数"}), 400
+    if 'grid' in request.args and (grid is None or not 1 <= grid <= MAX_GEO_CLUSTER_GRID):
+        return jsonify({"error": f"grid 必须是 1 到 {MAX_GEO_CLUSTER_GRID} 之间的整数"}), 400
+    max_points = GEO_MAX_POINTS if max_points is None else max_points
+    grid = GEO_CLUSTER_GRID if grid is None else grid
+    if snapshot.spatial_index is None:
+        return jsonify({"error": "站点地理信息不可用"}), 503
+
+    latest_time = current_overview_time(snapshot)
+
+    def build_payload():
+        rows = spatial.bbox_rows(snapshot.spatial_index, *bbox)
+        rows = rows[np.argsort(snapshot.spatial_index['positions'][rows], kind='stable')] # 按站点顺序返回
+        payload = {
+            "bbox": list(bbox),
+            "time": latest_time.strftime('%Y-%m-%d %H:%M:%S') if pd.notna(latest_time) else None,
+            "total": len(rows),
+            "clustered": len(rows) > max_points,
+        }
+        if payload["clustered"]:
+            payload["grid"] = grid
+            payload["clusters"] = geo_clusters(snapshot, rows, bbox, grid, latest_time)
+        else:
+            payload["stations"] = geo_station_records(snapshot, rows, latest_time)
+        return payload
+
+    # 当前时间点属于缓存键：进入新的 15 分钟间隔后自动换用新数据
+    time_key = latest_time.value if pd.notna(latest_time) else None
+    return make_cached_json_response(('geo', bbox, max_points, grid, time_key, snapshot.version), build_payload)
+
+
+# API 路由 (距指定坐标最近的 N 个站点及当前出力)
+# 例: /api/geo/nearest?lon=109.3&lat=38.3&n=10
+@app.route('/api/geo/nearest')
+def get_nearest_stations():
+    snapshot = SNAPSHOT
+    app.logger.debug("--- [API /api/geo/nearest] Request received: %s", request.args)
+    lon = request.args.get('lon', type=float)
+    lat = request.args.get('lat', type=float)
+    n = request.args.get('n', type=int)
+    if lon is None or lat is None or not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        return jsonify({"error": "缺少或无效的 lon/lat 参数"}), 400
+    if 'n' in request.args and (n is None or not 1 <= n <= MAX_NEAREST_STATIONS):
+        return jsonify({"error": f"n 必须是 1 到 {MAX_NEAREST_STATIONS} 之间的整数"}), 400
+    n = 10 if n is None else n
+    if snapshot.spatial_index is None:
+        return jsonify({"error": "站点地理信息不可用"}), 503
+
+    latest_time = current_overview_time(snapshot)
+    rows, distances = spatial.nearest_rows(snapshot.spatial_index, lon, lat, n)
+    return jsonify({
+        "longitude": lon,
+        "latitude": lat,
+        "time": latest_time.strftime('%Y-%m-%d %H:%M:%S') if pd.notna(latest_time) else None,
+        "stations": geo_station_records(snapshot, rows, latest_time, distances),
+    })
+
+
 # API 路由 (用于详情页图表数据)
+# 可选 issue_time=YYYY-MM-DDTHH:MM（截至该时刻已发布的最新预报）和/或 horizon=H（提前量至少 H 小时的预报），
+# 例: /api/data/power1/2021-11-16?horizon=24 为日前预报，?issue_time=2021-11-16T06:00 为该时刻看到的预报
 @app.route('/api/data/<path:station_id>/<date_str>')
 def get_daily_station_data(station_id, date_str):
-    global df_predictions # API 只返回预测数据
-    app.logger.info(f"--- [API /api/data/{station_id}/{date_str}] Request received ---")
+    snapshot = SNAPSHOT # API 只返回预测数据
+    app.logger.debug("--- [API /api/data/%s/%s] Request received ---", station_id, date_str)
 
-    if station_id not in STATION_NAMES:
+    if station_id not in snapshot.station_column_pos:
         app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] Invalid station ID.")
         return jsonify({"error": "无效的站点 ID"}), 404
 
     # 确保 df_predictions 已加载
-    if df_predictions.empty:
+    if snapshot.df_predictions.empty:
          app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] df_predictions is empty.")
          return jsonify({"error": "预测数据不可用"}), 503 # Service Unavailable
 
+    # 可选 issue_time / horizon：从多批次预报中选取，而不是最终预测值
+    try:
+        forecast = parse_forecast_selector(request.args)
+    except ValueError:
+        app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] Invalid issue_time/horizon: {dict(request.args)}")
+        return jsonify({"error": f"无效的 issue_time 或 horizon 参数（horizon 范围 0-{MAX_FORECAST_HORIZON_HOURS} 小时）"}), 400
+    if forecast is not None and snapshot.forecast_index is None:
+        return jsonify({"error": "没有预报批次数据"}), 404
+
     try:
         target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        app.logger.debug(f"--- [API /api/data/{station_id}/{date_str}] Target date: {target_date}")
+        app.logger.debug("--- [API /api/data/%s/%s] Target date: %s", station_id, date_str, target_date)
+
+        if forecast is not None:
+            return make_cached_json_response(
+                (station_id, date_str, forecast['issue_time'], forecast['horizon_hours'], snapshot.version),
+                lambda: build_forecast_station_payload(snapshot, station_id, date_str, target_date, forecast))
+
+        # 有预计算产物且该天行数未变时直接返回预计算的响应体
+        day_range = snapshot.prediction_day_index.get(date_str)
+        if snapshot.artifacts is not None and day_range is not None:
+            entry = artifacts.daily_body(snapshot.artifacts, snapshot.station_column_pos[station_id], date_str, day_range[1] - day_range[0])
+            ARTIFACT_LOOKUPS.inc('miss' if entry is None else 'hit')
+            if entry is not None:
+                return make_json_response(*entry)
+
+        # 缓存键用数据代数 + 当天行数而不是快照版本：增量追加只改变最新日期的行数，历史日期的缓存不失效；
+        # 全量加载换新代数，加载前开始的请求写入的旧响应不会被新快照命中
+        return make_cached_json_response(
+            (station_id, date_str, snapshot.generation, None if day_range is None else day_range[1] - day_range[0]),
+            lambda: build_daily_station_payload(snapshot, station_id, date_str, target_date))
 
-        # 过滤数据
-        if not isinstance(df_predictions.index, pd.DatetimeIndex):
-            app.logger.error("--- [API /api/data] df_predictions index is not DatetimeIndex!")
-            raise TypeError("Index not DatetimeIndex")
+    except ValueError:
+         app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] Invalid date format.")
+         return jsonify({"error": "无效的日期格式"}), 400
+    except Exception as e:
+        app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] Unexpected error: {e}", exc_info=True)
+        return jsonify({"error": "服务器内部错误"}), 500
 
-        df_filtered = df_predictions.loc[df_predictions.index.date == target_date].copy()
-        app.logger.debug(f"--- [API /api/data/{station_id}/{date_str}] Filtered data shape: {df_filtered.shape}")
 
-        if df_filtered.empty or station_id not in df_filtered.columns:
-             app.logger.warning(f"--- [API /api/data/{station_id}/{date_str}] No data found after filtering or column missing.")
-             return jsonify({"station": station_id, "date": date_str, "timestamps": [], "predictions": [], "message": f"站点 '{station_id}' 在日期 '{date_str}' 没有预测数据"})
+# API 路由 (多站点、多日范围数据，一次请求返回预测值与实际值)
+# 例: /api/range?stations=power1,power2&start=2021-11-16&end=2021-11-22
+# 可选 points=N：范围内数据点多于 N 时按时间分桶做 min/max 降采样
+@app.route('/api/range')
+def get_range_data():
+    snapshot = SNAPSHOT
+    stations = [s for s in request.args.get('stations', '').split(',') if s]
+    start_str, end_str = request.args.get('start', ''), request.args.get('end', '')
+    app.logger.debug("--- [API /api/range] Request received: stations=%s, start=%s, end=%s", stations, start_str, end_str)
+
+    if not stations:
+        return jsonify({"error": "缺少 stations 参数"}), 400
+    if len(stations) > MAX_RANGE_STATIONS:
+        return jsonify({"error": f"单次最多请求 {MAX_RANGE_STATIONS} 个站点"}), 400
+    unknown = [s for s in stations if s not in snapshot.station_column_pos]
+    if unknown:
+        app.logger.error(f"--- [API /api/range] Invalid station IDs: {unknown}")
+        return jsonify({"error": f"无效的站点 ID: {', '.join(unknown)}"}), 404
+    if snapshot.df_predictions.empty:
+        return jsonify({"error": "预测数据不可用"}), 503
+
+    try:
+        start = parse_range_bound(start_str, is_end=False)
+        end = parse_range_bound(end_str, is_end=True)
+    except ValueError:
+        app.logger.error(f"--- [API /api/range] Invalid start/end: {start_str}, {end_str}")
+        return jsonify({"error": "无效的日期格式（不支持时区偏移，年份须在 1677-2262 之间）"}), 400
+    if end < start:
+        return jsonify({"error": "结束时间早于开始时间"}), 400
+    points = request.args.get('points', type=int)
+    if 'points' in request.args and (points is None or not MIN_DOWNSAMPLE_POINTS <= points <= MAX_DOWNSAMPLE_POINTS):
+        return jsonify({"error": f"points 必须是 {MIN_DOWNSAMPLE_POINTS} 到 {MAX_DOWNSAMPLE_POINTS} 之间的整数"}), 400
+    max_days = MAX_DOWNSAMPLED_RANGE_DAYS if points else MAX_RANGE_DAYS
+    if end.value - start.value > pd.Timedelta(days=max_days).value: # 整数相减，跨度极大时也不会溢出
+        return jsonify({"error": f"时间跨度不能超过 {max_days} 天"}), 400
+
+    # 范围内的预测行数不超过 points 时无需降采样
+    stamps = snapshot.df_predictions.index.asi8
+    row_count = np.searchsorted(stamps, end.value, side='right') - np.searchsorted(stamps, start.value, side='left')
+    downsampled = points is not None and row_count > points
+
+    try:
+        if downsampled:
+            return make_cached_json_response(
+                ('range', tuple(stations), start.value, end.value, points, snapshot.version),
+                lambda: build_downsampled_range_payload(snapshot, stations, start, end, points))
+        return make_cached_json_response(
+            ('range', tuple(stations), start.value, end.value, None, snapshot.version),
+            lambda: build_range_payload(snapshot, stations, start, end))
+    except Exception as e:
+        app.logger.error(f"--- [API /api/range] Unexpected error: {e}", exc_info=True)
+        return jsonify({"error": "服务器内部错误"}), 500
 
-        prediction_data = df_filtered[station_id].tolist()
-        timestamps = df_filtered.index.strftime('%H:%M:%S').tolist()
-        app.logger.info(f"--- [API /api/data/{station_id}/{date_str}] Data found. Returning {len(timestamps)} timestamps.")
-        return jsonify({"station": station_id, "date": date_str, "timestamps": timestamps, "predictions": prediction_data})
 
+# API 路由 (预测精度指标：MAE / RMSE / MAPE / 偏差 / 容量归一化误差)
+# 例: /api/metrics?stations=power1,power2&start=2021-11-16&end=2021-11-30&group=day
+# stations 省略时为全部站点（仅 group=total）；start/end 省略时为全部数据
+@app.route('/api/metrics')
+def get_metrics():
+    snapshot = SNAPSHOT
+    group = request.args.get('group', 'total')
+    stations = [s for s in request.args.get('stations', '').split(',') if s]
+    app.logger.debug("--- [API /api/metrics] Request received: stations=%s, group=%s", stations, group)
+
+    if group not in METRIC_GROUPS:
+        return jsonify({"error": f"group 必须是 {', '.join(METRIC_GROUPS)} 之一"}), 400
+    if snapshot.metric_rollup is None:
+        return jsonify({"error": "精度指标不可用"}), 503
+    if not stations:
+        if group != 'total':
+            return jsonify({"error": "按天或按小时分组时必须指定 stations"}), 400
+        stations = snapshot.station_names
+    elif len(stations) > MAX_RANGE_STATIONS and group != 'total':
+        return jsonify({"error": f"单次最多请求 {MAX_RANGE_STATIONS} 个站点"}), 400
+    unknown = [s for s in stations if s not in snapshot.station_column_pos]
+    if unknown:
+        return jsonify({"error": f"无效的站点 ID: {', '.join(unknown)}"}), 404
+
+    epochs = snapshot.overview_time_lookup['epochs']
+    try:
+        start = parse_range_bound(request.args['start'], is_end=False) if 'start' in request.args else pd.Timestamp(epochs[0])
+        end = parse_range_bound(request.args['end'], is_end=True) if 'end' in request.args else pd.Timestamp(epochs[-1])
     except ValueError:
-         app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] Invalid date format.")
-         return jsonify({"error": "无效的日期格式"}), 400
+        return jsonify({"error": "无效的日期格式（不支持时区偏移，年份须在 1677-2262 之间）"}), 400
+    if end < start:
+        return jsonify({"error": "结束时间早于开始时间"}), 400
+
+    try:
+        return make_cached_json_response(
+            ('metrics', tuple(stations), start.value, end.value, group, snapshot.version),
+            lambda: build_metrics_payload(snapshot, stations, start, end, group))
     except Exception as e:
-        app.logger.error(f"--- [API /api/data/{station_id}/{date_str}] Unexpected error: {e}", exc_info=True)
+        app.logger.error(f"--- [API /api/metrics] Unexpected error: {e}", exc_info=True)
         return jsonify({"error": "服务器内部错误"}), 500
 
 
@@ -427,7 +1971,7 @@ load_data() # 加载全局数据
 # --- 运行应用 (仅在本地直接运行 python app.py 时使用) ---
 if __name__ == '__main__':
     # load_data() # 不再需要在这里调用
-    if not STATION_NAMES:
+    if not SNAPSHOT.station_names:
         app.logger.warning("\n[Startup Check] Warning: No station names loaded.\n")
     app.logger.info("--- Starting Flask development server (won't run on Render) ---")
     # 对于本地测试，可以开启 debug，但部署时 Gunicorn 不会执行这里
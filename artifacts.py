@@ -0,0 +1,282 @@
+# artifacts.py
+"""
+预计算产物存储：离线把 /api/data 的每个 (站点, 日期) JSON 响应体以及指标预聚合
+（metrics.build_rollup() 的结果）算好写入 DATA_FOLDER/artifacts/，
+各 gunicorn worker 加载时只打开（memmap）这些文件，请求处理变为一次查表加一次文件读取，
+多个 worker 共享同一份页缓存。
+
+  manifest.json               站点列表、日期及每天行数、源 CSV 的末尾校验状态、本次运行引用的文件
+  daily-<run>.<字段>.npy      (站点数, 日期数) 查找表：响应体所在段文件编号、偏移、长度及 ETag
+  segments/<run>-<lo>.bin     某次运行为站点 [lo, hi) 新生成的响应体，写入后不再修改
+  metrics-<run>.<名称>.npy    指标预聚合的小时起点、各统计量的小时级部分和（hourly-）与累加索引（cumulative-）、装机容量
+
+预计算按站点分块交给进程池（fork，子进程继承父进程已加载的数据快照）。再次运行时只为新增日期
+以及行数变化的日期（如追加了数据的最后一天）生成响应体并写入新的段文件，其余沿用上次的结果；
+指标预聚合每次按站点并行全量重算。--full 时全部重建。manifest 最后原子替换，
+之后删除不再引用的旧文件。
+
+产物只在站点列表一致、且预测 CSV 自预计算以来只被追加（见 datastore.csv_appended_only()）时使用；
+某天的行数与当前数据不一致时该天回退为实时计算。
+
+用法: python artifacts.py [--workers N] [--full]
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import datastore
+import metrics
+
+ARTIFACT_DIRNAME = 'artifacts'
+MANIFEST_FILENAME = 'manifest.json'
+SEGMENT_DIRNAME = 'segments'
+FORMAT_VERSION = 3 # 响应体序列化或指标预聚合格式变化时递增，旧产物不再使用
+DAILY_FIELDS = {'segment': np.int32, 'offset': np.int64, 'length': np.int64, 'etag': 'S40'}
+CHUNKS_PER_WORKER = 4 # 每个 worker 平均分到的任务数，任务更小时负载更均衡
+
+
+def artifact_folder(data_folder):
+    return os.path.join(data_folder, ARTIFACT_DIRNAME)
+
+
+def read_manifest(folder):
+    """读取 manifest；不存在、损坏或格式版本不一致时返回 None。"""
+    try:
+        with open(os.path.join(folder, MANIFEST_FILENAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format') == FORMAT_VERSION else None
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _decode_tail(entry):
+    return entry[0], bytes.fromhex(entry[1])
+
+
+def open_artifacts(folder, station_names, sources):
+    """
+    打开预计算产物。sources 为 {'predictions'|'truth'|'geo': 文件路径}。
+    返回 {'run', 'days': {日期: 列}, 'day_rows', 'segments', 'daily': {字段: memmap}, 'metric_rollup'}；
+    没有产物、站点列表不一致或预测 CSV 已被改写时返回 None。
+    实际 CSV 被改写或地理信息文件（装机容量）变化时 metric_rollup 为 None，由调用方现算。
+    """
+    manifest = read_manifest(folder)
+    if manifest is None or manifest['stations'] != list(station_names):
+        return None
+    tails = manifest['sources']
+    if not datastore.csv_appended_only(sources['predictions'], _decode_tail(tails['predictions'])):
+        return None
+    run = manifest['run']
+    store = {
+        'run': run,
+        'days': {day: col for col, day in enumerate(manifest['days'])},
+        'day_rows': manifest['day_rows'],
+        'segments': [os.path.join(folder, SEGMENT_DIRNAME, name) for name in manifest['segments']],
+        'daily': {name: np.load(os.path.join(folder, f"daily-{run}.{name}.npy"), mmap_mode='r') for name in DAILY_FIELDS},
+        'metric_rollup': None,
+    }
+    if (manifest['metric_covered_until'] is not None
+            and 'truth' in tails and datastore.csv_appended_only(sources['truth'], _decode_tail(tails['truth']))
+            and _file_signature(sources['geo']) == manifest['geo_signature']):
+        load = lambda name: np.load(os.path.join(folder, f"metrics-{run}.{name}.npy"), mmap_mode='r')
+        store['metric_rollup'] = {
+            'hour_start': load('hour_start'),
+            'hourly': {k: load(f"hourly-{k}") for k in metrics.STATS},
+            'cumulative': {k: load(f"cumulative-{k}") for k in metrics.STATS},
+            'capacity': load('capacity'),
+            'covered_until': manifest['metric_covered_until'],
+        }
+    return store
+
+
+def daily_body(store, position, day, rows):
+    """
+    站点（station_names 下标 position）在 day 的预计算响应体 (body, etag)。
+    没有该天、该天行数与当前数据（rows）不一致或段文件已被删除时返回 None。
+    """
+    col = store['days'].get(day)
+    if col is None or store['day_rows'][col] != rows:
+        return None
+    daily = store['daily']
+    segment = int(daily['segment'][position, col])
+    if segment < 0:
+        return None
+    offset, length = int(daily['offset'][position, col]), int(daily['length'][position, col])
+    try:
+        with open(store['segments'][segment], 'rb') as f:
+            body = os.pread(f.fileno(), length, offset)
+    except OSError: # --full 重建后旧段文件被删除，下次加载新产物前回退为实时计算
+        return None
+    if len(body) != length:
+        return None
+    return body, daily['etag'][position, col].decode('ascii')
+
+
+# --- 预计算 ---
+def _precompute_chunk(task):
+    """
+    进程池任务：站点 [lo, hi) 在 days 上的响应体写入一个段文件，并把这些站点的指标预聚合
+    写入父进程预先分配的 .npy 中对应的行。返回 (lo, 偏移, 长度, ETag)，形状均为 (hi - lo, len(days))。
+    """
+    import app # fork 出的子进程继承父进程已加载的模块与数据快照，不会重新加载
+
+    lo, hi, days, segment_path, metric_paths = task
+    snapshot = app.SNAPSHOT
+    stations = snapshot.station_names[lo:hi]
+    offsets = np.zeros((hi - lo, len(days)), dtype=np.int64)
+    lengths = np.zeros_like(offsets)
+    etags = np.zeros(offsets.shape, dtype=DAILY_FIELDS['etag'])
+    if days:
+        dates = [datetime.strptime(day, '%Y-%m-%d').date() for day in days]
+        with open(segment_path, 'wb') as f:
+            for i, station_id in enumerate(stations):
+                for j, (day, date) in enumerate(zip(days, dates)):
+                    body = app.encode_json(app.build_daily_station_payload(snapshot, station_id, day, date))
+                    offsets[i, j], lengths[i, j] = f.tell(), len(body)
+                    etags[i, j] = hashlib.sha1(body).hexdigest().encode('ascii')
+                    f.write(body)
+
+    if metric_paths:
+        rollup = app.build_metric_rollup(snapshot.df_predictions, snapshot.df_truth, snapshot.df_geo,
+                                         stations, snapshot.overview_time_lookup['epochs'])
+        arrays = [('capacity', rollup['capacity'])]
+        arrays += [(f"{kind}-{k}", rollup[kind][k]) for kind in ('hourly', 'cumulative') for k in metrics.STATS]
+        for name, values in arrays:
+            out = np.load(metric_paths[name], mmap_mode='r+')
+            out[lo:hi] = values
+            out.flush()
+    return lo, offsets, lengths, etags
+
+
+def precompute(snapshot, folder, sources, workers, full=False):
+    """
+    为快照中的全部站点生成产物，返回新生成的响应体数量。
+    不是 --full 且已有产物可用时，只计算新增日期和行数变化的日期。
+    """
+    run = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    os.makedirs(os.path.join(folder, SEGMENT_DIRNAME), exist_ok=True)
+    stations = snapshot.station_names
+    days = snapshot.available_dates
+    day_rows = [end - start for start, end in (snapshot.prediction_day_index[day] for day in days)]
+    daily = {name: np.zeros((len(stations), len(days)), dtype=dtype) for name, dtype in DAILY_FIELDS.items()}
+    daily['segment'][:] = -1
+
+    # --- 沿用上次运行中仍然有效的日期 ---
+    previous = None if full else open_artifacts(folder, stations, sources)
+    segments = []
+    if previous is not None:
+        old_daily = previous['daily']
+        for col, (day, rows) in enumerate(zip(days, day_rows)):
+            old = previous['days'].get(day)
+            if old is None or previous['day_rows'][old] != rows or (old_daily['segment'][:, old] < 0).any():
+                continue
+            for name in DAILY_FIELDS:
+                daily[name][:, col] = old_daily[name][:, old]
+        # 只保留仍被引用的旧段文件，并重新编号
+        referenced = np.unique(daily['segment'][daily['segment'] >= 0])
+        remap = np.full(len(previous['segments']) + 1, -1, dtype=np.int32)
+        remap[referenced] = np.arange(len(referenced))
+        daily['segment'] = remap[daily['segment']]
+        segments = [os.path.basename(previous['segments'][i]) for i in referenced]
+    todo = [col for col in range(len(days)) if (daily['segment'][:, col] < 0).any()]
+    todo_days = [days[col] for col in todo]
+
+    # --- 指标预聚合：父进程按全部对齐时间点预先分配，子进程各写自己的站点行 ---
+    metric_paths = {}
+    epochs = snapshot.overview_time_lookup.get('epochs', np.empty(0, dtype=np.int64))
+    if len(epochs):
+        hour_start = np.unique(epochs // metrics.HOUR_NS) * metrics.HOUR_NS
+        metric_paths['hour_start'] = os.path.join(folder, f"metrics-{run}.hour_start.npy")
+        np.save(metric_paths['hour_start'], hour_start)
+        n_blocks = -(-len(hour_start) // metrics.CUMULATIVE_BLOCK_HOURS)
+        arrays = [('capacity', np.float64, (len(stations),))]
+        arrays += [(f"hourly-{k}", metrics.HOURLY_DTYPE, (len(stations), len(hour_start))) for k in metrics.STATS]
+        arrays += [(f"cumulative-{k}", np.float64, (len(stations), n_blocks + 1)) for k in metrics.STATS]
+        for name, dtype, shape in arrays:
+            metric_paths[name] = os.path.join(folder, f"metrics-{run}.{name}.npy")
+            np.lib.format.open_memmap(metric_paths[name], mode='w+', dtype=dtype, shape=shape).flush()
+
+    # --- 按站点分块并行计算 ---
+    chunks = np.array_split(np.arange(len(stations)), min(len(stations), max(workers, 1) * CHUNKS_PER_WORKER))
+    tasks = []
+    for chunk in chunks:
+        if len(chunk):
+            lo, hi = int(chunk[0]), int(chunk[-1]) + 1
+            segment_path = os.path.join(folder, SEGMENT_DIRNAME, f"{run}-{lo}.bin")
+            tasks.append((lo, hi, todo_days, segment_path, metric_paths))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        for lo, offsets, lengths, etags in pool.map(_precompute_chunk, tasks):
+            if todo:
+                hi = lo + len(offsets)
+                block = np.ix_(np.arange(lo, hi), todo)
+                daily['segment'][block] = len(segments)
+                daily['offset'][block], daily['length'][block], daily['etag'][block] = offsets, lengths, etags
+                segments.append(f"{run}-{lo}.bin")
+
+    for name, values in daily.items():
+        np.save(os.path.join(folder, f"daily-{run}.{name}.npy"), values)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'run': run,
+        'created_at': time.time(),
+        'stations': list(stations),
+        'days': list(days),
+        'day_rows': day_rows,
+        'segments': segments,
+        'sources': {key: [offset, tail.hex()] for key, (offset, tail) in snapshot.csv_tails.items()},
+        'geo_signature': _file_signature(sources['geo']),
+        'metric_covered_until': int(epochs[-1]) if metric_paths else None,
+    }
+    tmp_path = os.path.join(folder, MANIFEST_FILENAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(folder, MANIFEST_FILENAME))
+
+    # 已打开旧产物的进程仍持有 memmap（删除不影响）；读取已删除段文件的请求回退为实时计算
+    for name in os.listdir(folder):
+        if name.startswith(('daily-', 'metrics-')) and not name.startswith((f"daily-{run}.", f"metrics-{run}.")):
+            os.remove(os.path.join(folder, name))
+    for name in set(os.listdir(os.path.join(folder, SEGMENT_DIRNAME))) - set(segments):
+        os.remove(os.path.join(folder, SEGMENT_DIRNAME, name))
+    return len(stations) * len(todo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--full', action='store_true', help='忽略已有产物，全部重建')
+    args = parser.parse_args()
+
+    # 指标预聚合由进程池并行计算，加载数据时不必串行构建或读取旧产物
+    os.environ['LOAD_METRIC_ROLLUP'] = '0'
+    os.environ['USE_ARTIFACTS'] = '0'
+    import app
+
+    snapshot = app.SNAPSHOT
+    if snapshot.df_predictions.empty:
+        sys.exit("No prediction data loaded; nothing to precompute.")
+    folder = artifact_folder(app.DATA_FOLDER)
+    start = time.perf_counter()
+    count = precompute(snapshot, folder, app.artifact_sources(), args.workers, full=args.full)
+    print(f"Precomputed {count} daily payloads for {len(snapshot.station_names)} stations "
+          f"with {args.workers} workers in {time.perf_counter() - start:.1f}s -> {folder}")
+
+
+if __name__ == '__main__':
+    main()
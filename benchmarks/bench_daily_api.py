@@ -0,0 +1,67 @@
+# benchmarks/bench_daily_api.py
+"""
+/api/data/<station>/<date> 响应体构建延迟基准：
+对比旧实现（index.date == target_date 全表扫描 + copy）与按天行偏移索引切片。
+两列计时的是同一段路径：构建响应 dict 并序列化为 JSON 字节（不经过路由与响应缓存）。
+
+用法: python benchmarks/bench_daily_api.py [--stations 200] [--days 30 90 365]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.synthetic_data import write_dataset  # noqa: E402
+
+
+def legacy_payload(df_predictions, station_id, date_str):
+    """旧实现：逐行构造 date 对象并复制整张表，返回与旧路由相同的响应 dict。"""
+    target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    df_filtered = df_predictions.loc[df_predictions.index.date == target_date].copy()
+    return {"station": station_id, "date": date_str, "timestamps": df_filtered.index.strftime('%H:%M:%S').tolist(),
+            "predictions": df_filtered[station_id].tolist()}
+
+
+def indexed_payload(snapshot, station_id, date_str):
+    """当前实现：按天行偏移索引切片单列。"""
+    return app.build_daily_station_payload(snapshot, station_id, date_str, datetime.strptime(date_str, '%Y-%m-%d').date())
+
+
+def time_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=200)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 90, 365])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app.app.logger.setLevel(logging.WARNING)
+    print(f"{'days':>6} {'rows':>8} {'legacy ms':>10} {'indexed ms':>11} {'speedup':>8}")
+    for n_days in args.days:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_dataset(tmp, args.stations, n_days)
+            app.DATA_FOLDER = tmp
+            app.load_data()
+            station_id = app.SNAPSHOT.station_names[-1]
+            date_str = app.SNAPSHOT.available_dates[len(app.SNAPSHOT.available_dates) // 2]
+            snapshot = app.SNAPSHOT
+            with app.app.app_context(): # encode_json 使用 app.json
+                legacy_ms = time_call(lambda: app.encode_json(legacy_payload(snapshot.df_predictions, station_id, date_str)), args.repeat)
+                indexed_ms = time_call(lambda: app.encode_json(indexed_payload(snapshot, station_id, date_str)), args.repeat)
+            print(f"{n_days:>6} {len(app.SNAPSHOT.df_predictions):>8} {legacy_ms:>10.2f} {indexed_ms:>11.2f} {legacy_ms / indexed_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_memory.py
+"""
+内存布局基准：在合成数据上报告每“站点·天”占用的字节数。
+  csv float64   pd.read_csv 得到的两张 float64 DataFrame（旧布局）
+  compact       datastore.compact_tables 后的 float32 按站点连续共享数组
+  store         二进制存储文件实际占用的块（memmap，多 worker 共享页缓存）
+  rollups       小时/日级降采样预聚合（每个 worker 私有）
+  metric rollup 精度指标的小时级部分和与累加索引（每个 worker 私有；使用预计算产物时为 memmap）
+
+用法: python benchmarks/bench_memory.py [--stations 500] [--days 365]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import datastore  # noqa: E402
+from benchmarks.synthetic_data import write_dataset  # noqa: E402
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+def array_bytes(tree):
+    """嵌套 dict 中全部 numpy 数组的字节数。"""
+    if isinstance(tree, dict):
+        return sum(array_bytes(v) for v in tree.values())
+    return getattr(tree, 'nbytes', 0)
+
+
+def store_bytes(csv_path):
+    prefix = datastore.store_prefix(csv_path)
+    folder = os.path.dirname(prefix)
+    name = os.path.basename(prefix)
+    # 按实际分配的块计算：values 中为追加预留的列是文件空洞，不占磁盘与页缓存
+    return sum(os.stat(os.path.join(folder, f)).st_blocks * 512 for f in os.listdir(folder) if f.startswith(name + '.'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(tmp, args.stations, args.days)
+        paths = [os.path.join(tmp, name) for name in (app.PREDICTION_FILENAME, app.TRUTH_FILENAME)]
+        frames = [pd.read_csv(p, index_col=0, parse_dates=True) for p in paths]
+        results = {'csv float64': sum(frame_bytes(df) for df in frames)}
+
+        compact = datastore.compact_tables(*frames)
+        shared_index = compact[0].index is compact[1].index
+        values = sum(df._mgr.blocks[0].values.nbytes for df in compact)
+        results['compact'] = values + compact[0].index.nbytes * (1 if shared_index else 2)
+        results['rollups'] = sum(array_bytes(app.build_table_rollups(df)) for df in compact)
+        epochs = app.build_time_lookup(compact[0].index, compact[1].index)['epochs']
+        stations = compact[0].columns.tolist()
+        results['metric rollup'] = array_bytes(app.build_metric_rollup(*compact, pd.DataFrame(), stations, epochs))
+
+        for p in paths:
+            datastore.convert_csv(p)
+        results['store'] = sum(store_bytes(p) for p in paths)
+
+    station_days = args.stations * args.days
+    print(f"dataset: {args.stations} stations x {args.days} days (prediction + truth)")
+    print(f"{'layout':>13} {'total MB':>9} {'bytes/station-day':>18}")
+    for label, total in results.items():
+        print(f"{label:>13} {total / 2**20:>9.1f} {total / station_days:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/bench_micro.py
+"""
+热点路径微基准：在合成的大规模数据上分别计时
+  load.csv / load.store        load_data()（解析 CSV / memmap 打开二进制存储）
+  overview.lookup              find_latest_aligned_time()
+  overview.compute             get_overview_data()
+  overview.page                GET /（每个间隔只计算一次概览，之后为模板渲染）
+  api_data.payload             build_daily_station_payload()（不含路由与序列化）
+  api_data.request_uncached    GET /api/data/...，每次清空响应缓存
+  api_data.request_cached      GET /api/data/...，命中响应缓存
+  api_range.request_uncached   GET /api/range，10 个站点 × 7 天
+  api_metrics.request_uncached GET /api/metrics，10 个站点按天分组
+站点与日期用固定种子随机选取，结果可在不同版本之间对比。
+
+用法: python benchmarks/bench_micro.py [--stations 500] [--days 365] [--repeat 50] [--json results.json]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import datastore  # noqa: E402
+from benchmarks.results import summarize, write_results  # noqa: E402
+from benchmarks.synthetic_data import write_dataset  # noqa: E402
+
+
+def sample(fn, repeat, setup=None):
+    """调用 fn repeat 次，返回每次的耗时（秒）；setup 在每次调用前执行，不计时。"""
+    seconds = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        fn(i)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--load-repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='结果写入该 JSON 文件')
+    args = parser.parse_args()
+
+    app.app.logger.setLevel(logging.WARNING)
+    client = app.app.test_client()
+    rng = np.random.default_rng(args.seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(tmp, args.stations, args.days, seed=args.seed)
+        app.DATA_FOLDER = tmp
+
+        app.USE_BINARY_STORE = False
+        results['load.csv'] = summarize(sample(lambda i: app.load_data(), args.load_repeat))
+        for filename in (app.PREDICTION_FILENAME, app.TRUTH_FILENAME):
+            datastore.convert_csv(os.path.join(tmp, filename), app.TIMESTAMP_COLUMN_INDEX)
+        app.USE_BINARY_STORE = True
+        results['load.store'] = summarize(sample(lambda i: app.load_data(), args.load_repeat))
+
+        snapshot = app.SNAPSHOT
+        stations = snapshot.station_names
+        dates = snapshot.available_dates
+        picks = [(stations[rng.integers(len(stations))], dates[rng.integers(len(dates))]) for _ in range(args.repeat)]
+        ranges = [(list(rng.choice(stations, size=min(10, len(stations)), replace=False)), dates[rng.integers(max(len(dates) - 7, 1))])
+                  for _ in range(args.repeat)]
+        now = datetime.now() + timedelta(hours=app.TIME_OFFSET_HOURS)
+        clear_cache = lambda i: app.RESPONSE_CACHE.clear()
+
+        results['overview.lookup'] = summarize(sample(
+            lambda i: app.find_latest_aligned_time(snapshot.overview_time_lookup, now), args.repeat))
+        results['overview.compute'] = summarize(sample(lambda i: app.get_overview_data(snapshot), args.repeat))
+        results['overview.page'] = summarize(sample(lambda i: client.get('/'), args.repeat))
+
+        def payload(i):
+            station_id, date_str = picks[i]
+            app.build_daily_station_payload(snapshot, station_id, date_str, datetime.strptime(date_str, '%Y-%m-%d').date())
+
+        results['api_data.payload'] = summarize(sample(payload, args.repeat))
+        results['api_data.request_uncached'] = summarize(sample(
+            lambda i: client.get(f'/api/data/{picks[i][0]}/{picks[i][1]}'), args.repeat, setup=clear_cache))
+        results['api_data.request_cached'] = summarize(sample(
+            lambda i: client.get(f'/api/data/{picks[0][0]}/{picks[0][1]}'), args.repeat))
+
+        def range_url(i, endpoint, extra=''):
+            ids, first = ranges[i]
+            last = (datetime.strptime(first, '%Y-%m-%d') + timedelta(days=6)).strftime('%Y-%m-%d')
+            return f"/api/{endpoint}?stations={','.join(ids)}&start={first}&end={last}{extra}"
+
+        results['api_range.request_uncached'] = summarize(sample(
+            lambda i: client.get(range_url(i, 'range')), args.repeat, setup=clear_cache))
+        results['api_metrics.request_uncached'] = summarize(sample(
+            lambda i: client.get(range_url(i, 'metrics', '&group=day')), args.repeat, setup=clear_cache))
+
+    params = {'stations': args.stations, 'days': args.days, 'repeat': args.repeat, 'load_repeat': args.load_repeat, 'seed': args.seed}
+    write_results(args.json, 'micro', params, results)
+    print(f"dataset: {args.stations} stations x {args.days} days")
+    print(f"{'benchmark':<30} {'p50 ms':>10} {'p90 ms':>10} {'mean ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<30} {stats['p50_ms']:>10.3f} {stats['p90_ms']:>10.3f} {stats['mean_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_overview.py
+"""
+概览页 "/" 延迟基准：对比旧实现（对全部历史做两次 strftime('%H:%M') 后字符串比较）
+与预计算的分钟数 searchsorted 查找结构。
+
+用法: python benchmarks/bench_overview.py [--stations 500] [--days 365 730 1095]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.synthetic_data import write_dataset  # noqa: E402
+
+
+def legacy_latest_time(df_predictions, df_truth, now):
+    """旧实现：逐行格式化 HH:MM 字符串，取 <= 当前时刻的最大时间戳（忽略日期）。"""
+    current_hm = now.strftime('%H:%M')
+    valid_pred = df_predictions.index[df_predictions.index.strftime('%H:%M') <= current_hm]
+    valid_truth = df_truth.index[df_truth.index.strftime('%H:%M') <= current_hm]
+    if valid_pred.empty or valid_truth.empty:
+        return None
+    return valid_pred.max()
+
+
+def time_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--days', type=int, nargs='+', default=[365, 730, 1095])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    app.app.logger.setLevel(logging.WARNING)
+    client = app.app.test_client()
+    now = datetime.now() + timedelta(hours=app.TIME_OFFSET_HOURS)
+    print(f"{'days':>6} {'rows':>8} {'legacy ms':>10} {'lookup ms':>10} {'GET / ms':>9}")
+    for n_days in args.days:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_dataset(tmp, args.stations, n_days)
+            app.DATA_FOLDER = tmp
+            app.load_data()
+            legacy_ms = time_call(lambda: legacy_latest_time(app.SNAPSHOT.df_predictions, app.SNAPSHOT.df_truth, now), args.repeat)
+            lookup_ms = time_call(lambda: app.find_latest_aligned_time(app.SNAPSHOT.overview_time_lookup, now), args.repeat)
+            page_ms = time_call(lambda: client.get('/'), args.repeat)
+            print(f"{n_days:>6} {len(app.SNAPSHOT.df_predictions):>8} {legacy_ms:>10.2f} {lookup_ms:>10.4f} {page_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_startup.py
+"""
+worker 启动基准：对比解析 CSV 与 memmap 打开二进制列式存储时，
+`import app`（即 load_data）的耗时以及每个 worker 的内存占用。
+
+RssAnon 为进程私有内存；RssFile 为映射文件的页缓存，多个 worker 之间共享。
+
+用法: python benchmarks/bench_startup.py [--stations 300] [--days 365]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import datastore  # noqa: E402
+from benchmarks.synthetic_data import write_dataset  # noqa: E402
+
+# 在子进程中执行：计时导入 app，并触摸全部数值（模拟请求访问过所有数据后的稳态）
+WORKER_SNIPPET = r"""
+import json, logging, time
+logging.disable(logging.CRITICAL)
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+float(app.SNAPSHOT.df_predictions.to_numpy().sum()) + float(app.SNAPSHOT.df_truth.to_numpy().sum())
+status = dict(line.split(':', 1) for line in open('/proc/self/status'))
+kb = lambda key: int(status.get(key, '0 kB').split()[0])
+print(json.dumps({'seconds': elapsed, 'rss_kb': kb('VmRSS'), 'rss_anon_kb': kb('RssAnon'), 'rss_file_kb': kb('RssFile')}))
+"""
+
+
+def run_worker(data_folder, use_store):
+    env = dict(os.environ, DATA_FOLDER=data_folder, USE_BINARY_STORE='1' if use_store else '0')
+    out = subprocess.run([sys.executable, '-c', WORKER_SNIPPET], cwd=REPO_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=300)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    import app  # noqa: F401  仅用于读取文件名配置
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(tmp, args.stations, args.days)
+        for filename in (app.PREDICTION_FILENAME, app.TRUTH_FILENAME):
+            datastore.convert_csv(os.path.join(tmp, filename), app.TIMESTAMP_COLUMN_INDEX)
+
+        print(f"dataset: {args.stations} stations x {args.days} days")
+        print(f"{'mode':>6} {'startup s':>10} {'RSS MB':>8} {'anon MB':>8} {'file MB':>8}")
+        for mode, use_store in (('csv', False), ('store', True)):
+            r = run_worker(tmp, use_store)
+            print(f"{mode:>6} {r['seconds']:>10.2f} {r['rss_kb'] / 1024:>8.1f} "
+                  f"{r['rss_anon_kb'] / 1024:>8.1f} {r['rss_file_kb'] / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/compare_results.py
+"""
+对比两次基准运行的 JSON 结果（bench_micro.py / loadtest.py 的 --json 输出）：
+按名称逐项比较指定统计量，变慢超过阈值的项标记为回归，存在回归时退出码为 1，可直接用于 CI。
+
+用法: python benchmarks/compare_results.py BASE.json NEW.json [--stat p50_ms] [--threshold 0.10]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import load_results  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--stat', default='p50_ms', help='比较的统计量，如 p50_ms、p90_ms、mean_ms')
+    parser.add_argument('--threshold', type=float, default=0.10, help='相对变慢超过该比例视为回归')
+    args = parser.parse_args()
+
+    base, new = load_results(args.base), load_results(args.new)
+    if base['suite'] != new['suite']:
+        sys.exit(f"suite mismatch: {base['suite']} vs {new['suite']}")
+    if base['params'] != new['params']:
+        print(f"warning: params differ\n  base: {base['params']}\n  new:  {new['params']}")
+    print(f"base: {base['environment']['git_revision']}  new: {new['environment']['git_revision']}  stat: {args.stat}")
+    print(f"{'benchmark':<30} {'base':>10} {'new':>10} {'change':>8}")
+
+    regressions = []
+    for name, stats in new['results'].items():
+        old_value = base['results'].get(name, {}).get(args.stat)
+        new_value = stats.get(args.stat)
+        if old_value is None or new_value is None:
+            continue
+        change = new_value / old_value - 1 if old_value else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<30} {old_value:>10.3f} {new_value:>10.3f} {change:>+7.1%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
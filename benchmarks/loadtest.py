@@ -0,0 +1,231 @@
+# benchmarks/loadtest.py
+"""
+HTTP 压测：C 个并发客户端在 D 秒内按权重混合请求概览页与各 API（闭环，每个客户端收到响应后才发下一个），
+统计吞吐量、错误数以及各类请求的延迟分位数。
+
+目标:
+  --target testclient  进程内 Flask 测试客户端（多线程，受 GIL 限制，主要衡量应用本身的开销）
+  --target gunicorn    在合成数据上启动 gunicorn（wsgi:application），通过 HTTP 长连接压测
+  --url URL            压测已在运行的服务（不生成数据）；该服务的数据应由
+                       python -m benchmarks.synthetic_data 以相同的 --stations/--days/--start 生成
+
+用法: python benchmarks/loadtest.py --target gunicorn [--stations 500] [--days 365]
+          [--workers 2] [--worker-class gthread] [--threads 8] [--concurrency 16] [--duration 20] [--json results.json]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import summarize, write_results  # noqa: E402
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 请求类型及权重（近似生产中的访问比例）
+REQUEST_MIX = (
+    ('overview', 3),
+    ('api_data', 10),
+    ('api_range', 2),
+    ('api_metrics', 1),
+)
+
+
+def fetch_json(base_url, path):
+    parsed = urllib.parse.urlsplit(base_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return json.loads(response.read())
+    finally:
+        conn.close()
+
+
+class RequestFactory:
+    """按 REQUEST_MIX 随机生成请求路径，站点与日期取自合成数据集。"""
+
+    def __init__(self, stations, dates, seed):
+        self.stations = stations
+        self.dates = dates
+        self.rng = random.Random(seed)
+        self.kinds = [kind for kind, _ in REQUEST_MIX]
+        self.weights = [weight for _, weight in REQUEST_MIX]
+
+    def next(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == 'overview':
+            return kind, '/'
+        station = self.rng.choice(self.stations)
+        date = self.rng.choice(self.dates)
+        if kind == 'api_data':
+            return kind, f'/api/data/{station}/{date}'
+        ids = ','.join(self.rng.sample(self.stations, min(5, len(self.stations))))
+        if kind == 'api_range':
+            return kind, f'/api/range?stations={ids}&start={date}&end={date}'
+        return kind, f'/api/metrics?stations={ids}&start={date}&end={date}&group=hour_of_day'
+
+
+def dataset_ids(n_stations, n_days, start):
+    """synthetic_data 生成的数据集中的站点 ID 与日期。"""
+    import pandas as pd
+    stations = [f'power{i}' for i in range(1, n_stations + 1)]
+    dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(start, periods=n_days, freq='D')]
+    return stations, dates
+
+
+def run_clients(make_send, factory_seed_base, stations, dates, concurrency, duration):
+    """启动 concurrency 个客户端线程，返回 ({请求类型: [耗时秒]}, {请求类型: 错误数}, 实际时长)。"""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(n):
+        send = make_send()
+        factory = RequestFactory(stations, dates, factory_seed_base + n)
+        local_latencies, local_errors = defaultdict(list), defaultdict(int)
+        while time.perf_counter() < deadline:
+            kind, path = factory.next()
+            start = time.perf_counter()
+            try:
+                ok = send(path)
+            except (OSError, http.client.HTTPException):
+                ok = False
+                send = make_send() # 连接出错后重新建立
+            local_latencies[kind].append(time.perf_counter() - start)
+            if not ok:
+                local_errors[kind] += 1
+        with lock:
+            for kind, values in local_latencies.items():
+                latencies[kind].extend(values)
+            for kind, count in local_errors.items():
+                errors[kind] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def http_sender(base_url):
+    """每个客户端线程一个 HTTP/1.1 长连接。"""
+    parsed = urllib.parse.urlsplit(base_url)
+
+    def make_send():
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+
+        def send(path):
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            return response.status < 400
+        return send
+    return make_send
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(data_folder, workers, worker_class, threads):
+    port = free_port()
+    env = dict(os.environ, DATA_FOLDER=data_folder, LOG_LEVEL='WARNING', HOT_RELOAD_INTERVAL_SECONDS='0')
+    cmd = [sys.executable, '-m', 'gunicorn', '--preload', '-w', str(workers), '-k', worker_class,
+           '--threads', str(threads), '-b', f'127.0.0.1:{port}', 'wsgi:application']
+    process = subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            fetch_json(base_url, '/api/status')
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=('testclient', 'gunicorn'), default='testclient')
+    parser.add_argument('--url', help='压测已在运行的服务，忽略 --target')
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--start', default='2021-01-01')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='结果写入该 JSON 文件')
+    args = parser.parse_args()
+
+    target = 'url' if args.url else args.target
+    params = {'target': target, 'stations': args.stations, 'days': args.days, 'concurrency': args.concurrency,
+              'duration': args.duration, 'seed': args.seed, 'mix': dict(REQUEST_MIX)}
+    process = None
+    with tempfile.TemporaryDirectory() as tmp:
+        if target == 'url':
+            base_url = args.url.rstrip('/')
+            make_send = http_sender(base_url)
+        else:
+            from benchmarks.synthetic_data import write_dataset
+            write_dataset(tmp, args.stations, args.days, start=args.start, seed=args.seed)
+            if target == 'gunicorn':
+                params.update(workers=args.workers, worker_class=args.worker_class, threads=args.threads)
+                process, base_url = start_gunicorn(tmp, args.workers, args.worker_class, args.threads)
+                make_send = http_sender(base_url)
+            else:
+                import app
+                app.app.logger.setLevel(logging.WARNING)
+                app.DATA_FOLDER = tmp
+                app.load_data()
+                flask_client = app.app.test_client()
+                make_send = lambda: (lambda path: flask_client.get(path).status_code < 400)
+
+        stations, dates = dataset_ids(args.stations, args.days, args.start)
+        try:
+            latencies, errors, elapsed = run_clients(make_send, args.seed * 1000, stations, dates,
+                                                     args.concurrency, args.duration)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    total = sum(len(v) for v in latencies.values())
+    results = {'all': {**summarize([x for v in latencies.values() for x in v]),
+                       'errors': sum(errors.values()), 'rps': round(total / elapsed, 2)}}
+    for kind, _ in REQUEST_MIX:
+        results[kind] = {**summarize(latencies.get(kind, [])), 'errors': errors.get(kind, 0),
+                         'rps': round(len(latencies.get(kind, [])) / elapsed, 2)}
+    write_results(args.json, 'loadtest', params, results)
+
+    print(f"target: {target}, concurrency {args.concurrency}, {elapsed:.1f}s")
+    print(f"{'request':<12} {'count':>8} {'rps':>9} {'errors':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for name, stats in results.items():
+        if stats['n']:
+            print(f"{name:<12} {stats['n']:>8} {stats['rps']:>9.1f} {stats['errors']:>7} "
+                  f"{stats['p50_ms']:>9.2f} {stats['p90_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
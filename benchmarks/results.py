@@ -0,0 +1,71 @@
+# benchmarks/results.py
+"""
+基准结果的机器可读输出：每次运行写一个 JSON 文件，包含运行环境（git 提交、Python/库版本、CPU 数）、
+参数以及各项结果的统计量（毫秒）。不同版本的结果文件可用 compare_results.py 对比。
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_revision():
+    """当前 git 提交（工作区有改动时加 -dirty），不在 git 仓库中时为 None。"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def environment():
+    return {
+        'git_revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def summarize(seconds):
+    """一组耗时样本（秒）-> 统计量（毫秒）。"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if ms.size == 0:
+        return {'n': 0}
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        'n': int(ms.size),
+        'mean_ms': round(float(ms.mean()), 4),
+        'min_ms': round(float(ms.min()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p90_ms': round(float(p90), 4),
+        'p99_ms': round(float(p99), 4),
+        'max_ms': round(float(ms.max()), 4),
+    }
+
+
+def write_results(path, suite, params, results):
+    """results 为 {名称: 统计量字典}。path 为 None 时不写文件。返回完整的结果文档。"""
+    document = {'suite': suite, 'environment': environment(), 'params': params, 'results': results}
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+    return document
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
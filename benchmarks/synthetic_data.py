@@ -0,0 +1,79 @@
+# benchmarks/synthetic_data.py
+"""
+合成数据生成器：按现有 CSV 格式生成 N 个站点 × M 天的 15 分钟预测/实际数据及地理信息。
+用于在接近生产规模的数据上测试 app.py 的热点路径。按天分块生成并追加写入，
+大规模数据集（上千站点 × 数年）也不需要把整张表放进内存。
+
+用法: python -m benchmarks.synthetic_data OUT_DIR [--stations 2000] [--days 365] [--start 2021-01-01] [--seed 0]
+生成后可用 DATA_FOLDER=OUT_DIR 启动应用。
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+FREQ = '15min'
+ROWS_PER_DAY = 96
+CHUNK_DAYS = 30 # 每块生成的天数
+
+
+def iter_frames(n_stations, n_days, start='2021-01-01', seed=0, chunk_days=CHUNK_DAYS):
+    """按时间分块生成 (df_predictions, df_truth)，列名 power1..powerN，索引为 15 分钟时间戳。"""
+    rng = np.random.default_rng(seed)
+    capacity = rng.uniform(5, 50, size=n_stations)
+    columns = [f'power{i}' for i in range(1, n_stations + 1)]
+    start = pd.Timestamp(start)
+    for first_day in range(0, n_days, chunk_days):
+        days = min(chunk_days, n_days - first_day)
+        index = pd.date_range(start + pd.Timedelta(days=first_day), periods=days * ROWS_PER_DAY, freq=FREQ, name='timestamp')
+        # 以正弦曲线模拟日间出力，夜间为 0
+        minute_of_day = (index.hour * 60 + index.minute).to_numpy()
+        daylight = np.clip(np.sin((minute_of_day - 360) / 720 * np.pi), 0, None)
+        truth = daylight[:, None] * capacity[None, :] * rng.uniform(0.6, 1.0, size=(len(index), n_stations))
+        noise = rng.normal(0, 0.05, size=truth.shape) * capacity[None, :]
+        predictions = np.clip(truth + noise * (daylight[:, None] > 0), 0, None)
+        yield (pd.DataFrame(predictions.round(4), index=index, columns=columns),
+               pd.DataFrame(truth.round(4), index=index, columns=columns))
+
+
+def make_geo(n_stations, seed=0):
+    """返回与 station_geo_info.csv 同结构的地理信息表。"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'station_id': [f'power{i}' for i in range(1, n_stations + 1)],
+        'longitude': rng.uniform(105, 112, size=n_stations).round(6),
+        'latitude': rng.uniform(32, 40, size=n_stations).round(6),
+        'elevation': rng.uniform(300, 2000, size=n_stations).round(2),
+    })
+
+
+def write_dataset(out_dir, n_stations, n_days, start='2021-01-01', seed=0):
+    """将合成数据按 app.py 期望的文件名写入 out_dir。"""
+    import app  # 延迟导入，复用 app 中的文件名配置
+
+    os.makedirs(out_dir, exist_ok=True)
+    prediction_path = os.path.join(out_dir, app.PREDICTION_FILENAME)
+    truth_path = os.path.join(out_dir, app.TRUTH_FILENAME)
+    for i, (df_predictions, df_truth) in enumerate(iter_frames(n_stations, n_days, start=start, seed=seed)):
+        mode, header = ('w', True) if i == 0 else ('a', False)
+        df_predictions.to_csv(prediction_path, mode=mode, header=header, float_format='%.4f')
+        df_truth.to_csv(truth_path, mode=mode, header=header, float_format='%.4f')
+    make_geo(n_stations, seed=seed).to_csv(os.path.join(out_dir, app.GEO_INFO_FILENAME), index=False)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--stations', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--start', default='2021-01-01')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_dataset(args.out_dir, args.stations, args.days, start=args.start, seed=args.seed)
+    print(f"wrote {args.stations} stations x {args.days} days to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+# config.py
+"""
+数据文件位置配置。app.py 与离线脚本（如 `python datastore.py`）共用，
+脚本只需读取配置时导入本模块，而不必导入 app（导入 app 会在模块级别完整加载一次数据）。
+"""
+import os
+
+# 获取 app.py 文件所在的目录
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+# 构建 data 文件夹的绝对路径
+DATA_FOLDER = os.environ.get('DATA_FOLDER', os.path.join(BASE_DIR, 'data')) # 使用绝对路径，可通过环境变量覆盖
+
+PREDICTION_FILENAME = 'final_recovered_predictions.csv'
+TRUTH_FILENAME = 'final_recovered_truth.csv' # 需要真实值文件
+GEO_INFO_FILENAME = 'station_geo_info.csv'
+TIMESTAMP_COLUMN_INDEX = 0 # 假设时间戳在第一列
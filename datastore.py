@@ -0,0 +1,324 @@
+# datastore.py
+"""
+二进制列式数据存储：将预测/实际 CSV 一次性转换为
+  <name>.index.npy   int64 纳秒时间戳（已排序）
+  <name>.values.npy  float32，形状 (站点数, 行数 + 预留行数)，按站点连续存放
+  <name>.meta.json   列名、行数、源 CSV 的 size/mtime（用于判断是否过期）及转换时的 CSV 末尾校验字节
+各 gunicorn worker 通过 numpy memmap 只读打开，共享同一份页缓存，
+不再各自解析 CSV 并持有私有的 float64 DataFrame。
+
+转换后 CSV 只在末尾追加了行时存储仍然可用（见 open_appendable()）：追加的行从 CSV 增量读取，
+写入 values 的预留列（写时复制映射，只有被写到的页成为进程私有），已转换的部分仍共享页缓存。
+预留列在文件中是空洞，不占磁盘；用完后追加的行会使整表复制到私有内存，应在此之前重新转换。
+
+用法: python datastore.py   # 转换 DATA_FOLDER 下的预测与实际 CSV，以及尚未转换的预报批次 CSV
+"""
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+STORE_DIRNAME = 'store'
+VALUES_DTYPE = np.float32
+RESERVE_ROWS = 96 * 92 # values 文件为追加预留的行数（约一个季度的 15 分钟数据）
+
+
+def store_prefix(csv_path):
+    """CSV 对应的存储文件前缀：<csv 所在目录>/store/<csv 文件名去扩展名>。"""
+    folder, filename = os.path.split(csv_path)
+    return os.path.join(folder, STORE_DIRNAME, os.path.splitext(filename)[0])
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def convert_csv(csv_path, timestamp_column_index=0, reserve_rows=RESERVE_ROWS):
+    """解析一次 CSV 并写出二进制存储；返回存储前缀。"""
+    # 先记录源签名与末尾位置，只解析到最后一个完整行，之后追加的行由 open_appendable() 增量读取
+    signature = _source_signature(csv_path)
+    tail_offset, tail_bytes = csv_tail_state(csv_path)
+    with open(csv_path, 'rb') as f:
+        data = f.read(tail_offset)
+    df = pd.read_csv(io.BytesIO(data), index_col=timestamp_column_index, parse_dates=True)
+    del data
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    prefix = store_prefix(csv_path)
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+
+    # 先写临时文件再原子替换，meta 最后写入，保证读者看到的总是完整版本
+    index_values = df.index.values.astype('datetime64[ns]').view(np.int64)
+    tmp_path = f"{prefix}.index.npy.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, index_values)
+    os.replace(tmp_path, prefix + '.index.npy')
+    # open_memmap 只写入前 len(df) 列，预留列保持为文件空洞
+    tmp_path = f"{prefix}.values.npy.tmp"
+    values = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=VALUES_DTYPE, shape=(df.shape[1], len(df) + reserve_rows))
+    values[:, :len(df)] = df.to_numpy(dtype=VALUES_DTYPE).T
+    values.flush()
+    del values
+    os.replace(tmp_path, prefix + '.values.npy')
+
+    meta = {
+        'columns': [str(c) for c in df.columns],
+        'index_name': df.index.name,
+        'rows': int(len(df)),
+        'dtype': np.dtype(VALUES_DTYPE).name,
+        'source_tail': [tail_offset, tail_bytes.hex()],
+        **signature,
+    }
+    tmp_path = f"{prefix}.meta.json.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, prefix + '.meta.json')
+    return prefix
+
+
+def read_meta(csv_path):
+    """读取存储的 meta；不存在或损坏时返回 None。"""
+    try:
+        with open(store_prefix(csv_path) + '.meta.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_is_fresh(csv_path):
+    """二进制存储存在且与当前 CSV 的 size/mtime 一致时返回 True。"""
+    meta = read_meta(csv_path)
+    if meta is None or not os.path.exists(csv_path):
+        return False
+    return all(meta.get(k) == v for k, v in _source_signature(csv_path).items())
+
+
+def open_store(csv_path):
+    """
+    以 memmap 只读方式打开 CSV 对应的二进制存储，返回 DataFrame。
+    DataFrame 直接引用 memmap（不复制），因此其数值是只读的。
+    """
+    prefix = store_prefix(csv_path)
+    meta = read_meta(csv_path)
+    if meta is None:
+        raise FileNotFoundError(f"Binary store not found for {csv_path}")
+    index_values = np.load(prefix + '.index.npy', mmap_mode='r')
+    station_major = np.load(prefix + '.values.npy', mmap_mode='r')[:, :meta['rows']] # 不含预留列
+    index = pd.DatetimeIndex(np.asarray(index_values).view('datetime64[ns]'), name=meta.get('index_name'))
+    # station_major.T 是 (行数, 站点数) 的视图，pandas 将其作为单个 block 保存而不复制
+    return pd.DataFrame(station_major.T, index=index, columns=meta['columns'], copy=False)
+
+
+def open_appendable(csv_path):
+    """
+    打开 CSV 对应的二进制存储，并补读转换之后追加到 CSV 末尾的行，返回 (GrowableTable, tail_state)；
+    tail_state 供之后继续用 read_csv_tail() 增量读取。
+    values 以写时复制方式映射：已转换的行与其他 worker 共享页缓存，追加的行写入预留列，
+    只有被写到的页成为进程私有。存储不存在、由旧版本转换（没有末尾校验字节）或 CSV 已被改写时返回 None。
+    """
+    meta = read_meta(csv_path)
+    if meta is None or 'source_tail' not in meta:
+        return None
+    tail_offset, tail_hex = meta['source_tail']
+    tail_state = (tail_offset, bytes.fromhex(tail_hex))
+    if not csv_appended_only(csv_path, tail_state):
+        return None
+    prefix = store_prefix(csv_path)
+    index_values = np.load(prefix + '.index.npy', mmap_mode='r')
+    storage = np.load(prefix + '.values.npy', mmap_mode='c')
+    rows = meta['rows']
+    index = pd.DatetimeIndex(np.asarray(index_values).view('datetime64[ns]'), name=meta.get('index_name'))
+    table = GrowableTable(pd.DataFrame(storage[:, :rows].T, index=index, columns=meta['columns'], copy=False), storage=storage)
+    result = read_csv_tail(csv_path, tail_state, table.columns)
+    if result is None:
+        return None
+    df_new, tail_state = result
+    table.append(df_new)
+    return table, tail_state
+
+
+def compact_tables(df_predictions, df_truth):
+    """
+    把预测/实际两张表转换为紧凑布局：float32、按站点连续存放。
+    两张表的时间索引与列完全一致时，共用一个 (2, 站点数, 行数) 的连续数组和同一个索引对象；
+    否则分别转换。已是 float32 的表（如 memmap 存储）原样返回，不复制到私有内存。
+    返回 (df_predictions, df_truth)。
+    """
+    def frame(values, index, columns):
+        return pd.DataFrame(values.T, index=index, columns=columns, copy=False)
+
+    def is_compact(df):
+        return not (df.dtypes != VALUES_DTYPE).any()
+
+    if is_compact(df_predictions) or is_compact(df_truth):
+        return tuple(df if is_compact(df) else frame(np.ascontiguousarray(df.to_numpy(dtype=VALUES_DTYPE).T), df.index, df.columns)
+                     for df in (df_predictions, df_truth))
+    if (not df_predictions.empty and df_predictions.index.equals(df_truth.index)
+            and df_predictions.columns.equals(df_truth.columns)):
+        combined = np.empty((2,) + df_predictions.shape[::-1], dtype=VALUES_DTYPE)
+        combined[0] = df_predictions.to_numpy(dtype=VALUES_DTYPE).T
+        combined[1] = df_truth.to_numpy(dtype=VALUES_DTYPE).T
+        index = df_predictions.index
+        return frame(combined[0], index, df_predictions.columns), frame(combined[1], index, df_truth.columns)
+    return tuple(frame(np.ascontiguousarray(df.to_numpy(dtype=VALUES_DTYPE).T), df.index, df.columns)
+                 for df in (df_predictions, df_truth))
+
+
+class AppendBuffer:
+    """
+    沿最后一个轴追加的预分配数组，容量不足时按 GROWTH_FACTOR 扩容，追加为摊销 O(单行大小)。
+    view() 返回前 n 个元素的视图；已发出的视图不会被后续追加修改
+    （追加只写入 n 之后的位置，扩容则换用新数组），因此可被不可变快照安全引用。
+    """
+    GROWTH_FACTOR = 1.5
+    MIN_EXTRA = 96 * 7 # 至少预留一周的 15 分钟数据
+
+    @classmethod
+    def wrap(cls, storage, size):
+        """直接使用 storage 作为缓冲区（前 size 个元素为已有数据，其后为预留容量），不复制。"""
+        buffer = cls.__new__(cls)
+        buffer._data = storage
+        buffer.size = size
+        return buffer
+
+    def __init__(self, initial):
+        initial = np.asarray(initial)
+        n = initial.shape[-1]
+        capacity = n + max(int(n * (self.GROWTH_FACTOR - 1)), self.MIN_EXTRA)
+        self._data = np.empty(initial.shape[:-1] + (capacity,), dtype=initial.dtype)
+        self._data[..., :n] = initial
+        self.size = n
+
+    def append(self, block):
+        block = np.asarray(block, dtype=self._data.dtype)
+        k = block.shape[-1]
+        needed = self.size + k
+        if needed > self._data.shape[-1]:
+            capacity = max(needed, int(self._data.shape[-1] * self.GROWTH_FACTOR))
+            grown = np.empty(self._data.shape[:-1] + (capacity,), dtype=self._data.dtype)
+            grown[..., :self.size] = self._data[..., :self.size]
+            self._data = grown
+        self._data[..., self.size:needed] = block
+        self.size = needed
+
+    def view(self):
+        return self._data[..., :self.size]
+
+
+class GrowableTable:
+    """
+    可追加的时间序列表：int64 纳秒索引 + 按站点连续存放的数值 (站点数, 行数)。
+    仅允许追加严格晚于最后一行的时间戳；frame() 返回不复制数据的 DataFrame 视图。
+    storage 为形状 (站点数, 容量) 的数组且前 len(df) 列即 df 的数值时（如写时复制映射的存储文件），
+    直接在其上追加而不复制 df。
+    """
+
+    def __init__(self, df, storage=None):
+        self.columns = df.columns
+        self.index_name = df.index.name
+        self._index = AppendBuffer(df.index.values.astype('datetime64[ns]').view(np.int64))
+        self._values = AppendBuffer(df.to_numpy().T) if storage is None else AppendBuffer.wrap(storage, len(df))
+
+    def __len__(self):
+        return self._index.size
+
+    def index_values(self):
+        """已排序的 int64 纳秒时间戳视图。"""
+        return self._index.view()
+
+    def last_timestamp(self):
+        """最后一行的纳秒时间戳，空表返回 None。"""
+        return int(self._index.view()[-1]) if self._index.size else None
+
+    def append(self, df_new):
+        """
+        追加 df_new 中晚于最后一行的行（列按 self.columns 对齐，缺失站点为 NaN），
+        返回实际追加的行数。
+        """
+        if df_new.empty:
+            return 0
+        df_new = df_new.sort_index()
+        stamps = df_new.index.values.astype('datetime64[ns]').view(np.int64)
+        last = self.last_timestamp()
+        keep = np.ones(len(stamps), dtype=bool) if last is None else stamps > last
+        keep[1:] &= stamps[1:] != stamps[:-1] # 同一时间戳只保留第一行
+        if not keep.any():
+            return 0
+        values = df_new.reindex(columns=self.columns).to_numpy(dtype=self._values.view().dtype)[keep]
+        self._index.append(stamps[keep])
+        self._values.append(values.T)
+        return int(keep.sum())
+
+    def frame(self):
+        index = pd.DatetimeIndex(self._index.view().view('datetime64[ns]'), name=self.index_name, copy=False)
+        return pd.DataFrame(self._values.view().T, index=index, columns=self.columns, copy=False)
+
+
+# --- 追加写入 CSV 的增量读取 ---
+TAIL_CHECK_BYTES = 64
+
+
+def csv_tail_state(csv_path, size=None):
+    """
+    返回 (offset, tail_bytes)：offset 为前 size 字节中最后一个换行符之后的位置，
+    tail_bytes 为 offset 之前的最多 TAIL_CHECK_BYTES 字节，用于下次确认文件只是被追加。
+    """
+    with open(csv_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size if size is None else size
+        start = max(0, size - 64 * 1024)
+        f.seek(start)
+        chunk = f.read(size - start)
+    offset = start + chunk.rfind(b'\n') + 1
+    return offset, chunk[max(0, offset - start - TAIL_CHECK_BYTES):offset - start]
+
+
+def _tail_matches(f, tail_state):
+    """f 的前 offset 字节末尾仍是记录的校验字节（文件只被追加）时返回 True，此时 f 位于 offset 处。"""
+    offset, tail_bytes = tail_state
+    if os.fstat(f.fileno()).st_size < offset:
+        return False
+    f.seek(offset - len(tail_bytes))
+    return f.read(len(tail_bytes)) == tail_bytes
+
+
+def csv_appended_only(csv_path, tail_state):
+    """CSV 自 csv_tail_state() 记录以来只在末尾追加了内容（或未变化）时返回 True；文件不存在时返回 False。"""
+    try:
+        with open(csv_path, 'rb') as f:
+            return _tail_matches(f, tail_state)
+    except OSError:
+        return False
+
+
+def read_csv_tail(csv_path, tail_state, columns):
+    """
+    读取 CSV 自 tail_state 之后新追加的完整行（时间戳在第一列，其余列依次为 columns），
+    返回 (df_new, new_tail_state)。
+    文件被截断或改写（校验字节不一致）时返回 None，调用方应全量重新加载。
+    """
+    offset, tail_bytes = tail_state
+    with open(csv_path, 'rb') as f:
+        if not _tail_matches(f, tail_state):
+            return None
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1] # 只处理完整的行，写到一半的行留到下次
+    if not data.strip():
+        return pd.DataFrame(columns=columns), tail_state
+    new_offset = offset + len(data)
+    new_tail = (tail_bytes + data)[-TAIL_CHECK_BYTES:]
+    df_new = pd.read_csv(io.BytesIO(data), header=None, names=['timestamp', *columns], index_col=0, parse_dates=True)
+    return df_new, (new_offset, new_tail)
+
+
+if __name__ == '__main__':
+    import config # 只读取文件位置，不导入 app（导入 app 会完整加载一次数据）
+    import forecasts
+
+    paths = [os.path.join(config.DATA_FOLDER, filename) for filename in (config.PREDICTION_FILENAME, config.TRUTH_FILENAME)]
+    paths += [path for _, path in forecasts.list_runs(forecasts.runs_folder(config.DATA_FOLDER)) if not store_is_fresh(path)]
+    for path in paths:
+        print(f"Converting {path} -> {store_prefix(path)}.*", flush=True)
+        convert_csv(path, config.TIMESTAMP_COLUMN_INDEX)
@@ -0,0 +1,118 @@
+# downsample.py
+"""
+长时间范围的服务端降采样（按时间分桶的 min/max，保留曲线形状）以及小时/日级预聚合。
+
+所有函数都在“段”(segment) 上工作：每个段覆盖一段时间 [start, end]，
+对每个站点给出该段内的最小值、最大值，以及最小值是否先于最大值出现 (min_first)。
+原始 15 分钟数据是 start == end、min == max 的段；小时/日级预聚合就是较长的段。
+因此同一套分桶逻辑既能处理原始行，也能直接复用预聚合结果，而不必回看原始数据。
+
+数值数组均按站点连续存放，形状为 (站点数, 段数)。
+"""
+import numpy as np
+
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+ROLLUP_LEVELS = {'hour': HOUR_NS, 'day': DAY_NS}
+RAW_ALIGN_NS = 15 * 60 * 10**9 # 直接使用原始行时，桶宽按 15 分钟取整
+ROLLUP_STATION_CHUNK = 64 # 预聚合时每批处理的站点数，限制临时数组的内存
+
+
+def raw_segments(stamps, values):
+    """原始行 -> 段。stamps 为 int64 纳秒，values 形状 (站点数, 行数)。"""
+    return {'start': stamps, 'end': stamps, 'min': values, 'max': values, 'min_first': None}
+
+
+def _reduce_groups(segments, group_starts):
+    """把连续的段按 group_starts（每组第一个段的下标）合并为新的段。"""
+    mins, maxs = segments['min'], segments['max']
+    n = mins.shape[1]
+    lengths = np.diff(np.append(group_starts, n))
+    gmin = np.fmin.reduceat(mins, group_starts, axis=1)
+    gmax = np.fmax.reduceat(maxs, group_starts, axis=1)
+
+    # 组内最小/最大值第一次出现的位置，用于确定两者的先后顺序
+    positions = np.arange(n)
+    first_min = np.minimum.reduceat(np.where(mins == np.repeat(gmin, lengths, axis=1), positions, n), group_starts, axis=1)
+    first_max = np.minimum.reduceat(np.where(maxs == np.repeat(gmax, lengths, axis=1), positions, n), group_starts, axis=1)
+    gmin_first = first_min < first_max
+    same = first_min == first_max
+    if segments['min_first'] is None:
+        gmin_first |= same # 原始行 min == max，先后无所谓
+    else:
+        inner = np.take_along_axis(segments['min_first'], np.minimum(first_min, n - 1), axis=1)
+        gmin_first |= same & inner
+    return {
+        'start': segments['start'][group_starts],
+        'end': segments['end'][group_starts + lengths - 1],
+        'min': gmin,
+        'max': gmax,
+        'min_first': gmin_first,
+    }
+
+
+def build_rollup(stamps, values, period_ns):
+    """
+    按 period_ns 对齐的时间段（如整点小时、自然日）预聚合原始数据。
+    返回的段额外带 'period' 字段：每段所属时间段的起点（纳秒）。
+    """
+    if len(stamps) == 0:
+        return None
+    period = stamps // period_ns
+    group_starts = np.flatnonzero(np.concatenate(([True], period[1:] != period[:-1])))
+    parts = []
+    for lo in range(0, values.shape[0], ROLLUP_STATION_CHUNK):
+        chunk = np.asarray(values[lo:lo + ROLLUP_STATION_CHUNK])
+        parts.append(_reduce_groups(raw_segments(stamps, chunk), group_starts))
+    rollup = {
+        'start': parts[0]['start'],
+        'end': parts[0]['end'],
+        'min': np.concatenate([p['min'] for p in parts]),
+        'max': np.concatenate([p['max'] for p in parts]),
+        'min_first': np.concatenate([p['min_first'] for p in parts]),
+    }
+    rollup['period'] = period[group_starts] * period_ns
+    return rollup
+
+
+def select_segments(segments, rows, lo, hi):
+    """取段 [lo, hi) 中 rows 指定站点（行下标）的部分。"""
+    return {
+        'start': segments['start'][lo:hi],
+        'end': segments['end'][lo:hi],
+        'min': segments['min'][rows, lo:hi],
+        'max': segments['max'][rows, lo:hi],
+        'min_first': None if segments['min_first'] is None else segments['min_first'][rows, lo:hi],
+    }
+
+
+def concat_segments(parts):
+    """按时间顺序拼接若干段集合（如：原始行 + 预聚合 + 原始行）。"""
+    parts = [p for p in parts if len(p['start'])]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    min_first = [p['min_first'] if p['min_first'] is not None else np.ones(p['min'].shape, dtype=bool) for p in parts]
+    return {
+        'start': np.concatenate([p['start'] for p in parts]),
+        'end': np.concatenate([p['end'] for p in parts]),
+        'min': np.concatenate([p['min'] for p in parts], axis=1),
+        'max': np.concatenate([p['max'] for p in parts], axis=1),
+        'min_first': np.concatenate(min_first, axis=1),
+    }
+
+
+def minmax_buckets(segments, origin, bucket_ns):
+    """
+    按固定时间宽度分桶：桶 k 覆盖 [origin + k*bucket_ns, origin + (k+1)*bucket_ns)。
+    每个非空桶输出两个点（最小值和最大值，按出现顺序），保留尖峰与低谷。
+    返回 (桶编号 int64 数组, 第一个点的值, 第二个点的值, 桶内第一个样本的时间, 桶内最后一个样本的时间)，
+    值的形状为 (站点数, 桶数)，时间为 int64 纳秒 (桶数,)。
+    """
+    bucket = (segments['start'] - origin) // bucket_ns
+    group_starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    reduced = _reduce_groups(segments, group_starts)
+    first = np.where(reduced['min_first'], reduced['min'], reduced['max'])
+    second = np.where(reduced['min_first'], reduced['max'], reduced['min'])
+    return bucket[group_starts], first, second, reduced['start'], reduced['end']
@@ -0,0 +1,155 @@
+# forecasts.py
+"""
+多批次预报存储：保留每一次预报运行（按发布时间 issue_time 区分，如日前、日内滚动预报）的全部结果，
+支持“截至 T 时刻已发布的最新预报”以及“提前量至少 H 小时的预报”查询。
+
+每个批次一个 CSV，放在 DATA_FOLDER/forecast_runs/ 下，文件名为发布时间（如 20211116T0600.csv），
+格式与预测 CSV 相同（第一列为目标时间，其余列为站点）。批次表按现有方式读取
+（二进制存储未过期时 memmap 打开，见 datastore；`python datastore.py` 会一并转换），
+数值不合并复制，只在全部批次的 (目标时间, 发布时间) 上建立一个排序索引：
+
+  keys = 目标时间序号 * 批次数 + 批次序号      （批次按发布时间升序编号）
+
+同一目标时间的所有批次在 keys 中连续且按发布时间升序，因此对任意多个目标时间查询
+“发布时间 <= T 的最新批次”只需一次向量化 searchsorted：查找 目标序号 * 批次数 + (发布时间 <= T 的批次数)
+的插入位置，前一个元素若属于同一目标时间即为答案。T 可以逐个目标时间不同（提前量查询时 T = 目标时间 - H）。
+批次可能只包含部分站点：某站点在选中的批次中缺失或为 NaN 时，select() 对该站点把 T 改为该批次发布时间之前
+再查一次，逐个站点回退到更早的、有该站点数值的批次。
+新批次到达时只读取新文件，索引整体重建（只涉及时间戳，开销很小）。
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from downsample import HOUR_NS
+
+RUNS_DIRNAME = 'forecast_runs'
+RUN_FILENAME_PATTERN = re.compile(r'^(\d{8}T\d{4})\.csv$')
+RUN_TIME_FORMAT = '%Y%m%dT%H%M'
+
+
+def runs_folder(data_folder):
+    return os.path.join(data_folder, RUNS_DIRNAME)
+
+
+def list_runs(folder):
+    """[(发布时间 int64 纳秒, 文件路径)]，按发布时间排序；文件名不符合格式的文件忽略。"""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    runs = []
+    for name in names:
+        match = RUN_FILENAME_PATTERN.match(name)
+        if match:
+            issue_time = pd.to_datetime(match.group(1), format=RUN_TIME_FORMAT)
+            runs.append((issue_time.value, os.path.join(folder, name)))
+    return sorted(runs)
+
+
+def folder_signature(folder):
+    """(批次文件数, 最大 mtime_ns)，用于检测新批次；目录不存在时为 (0, None)。"""
+    mtimes = []
+    for _, path in list_runs(folder):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            pass
+    return len(mtimes), max(mtimes, default=None)
+
+
+def build_index(runs):
+    """
+    runs 为 [(发布时间 int64 纳秒, 按目标时间排序的 DataFrame)]。没有批次时返回 None。
+    索引包含批次发布时间 issue_times、各批次表 frames、全部目标时间 targets（去重排序），
+    以及按 keys 排序的 (keys, run, row)：每个 (目标时间, 批次) 对应批次表中的行号。
+    """
+    if not runs:
+        return None
+    runs = sorted(runs, key=lambda r: r[0])
+    frames = [frame for _, frame in runs]
+    stamps = [frame.index.asi8 for frame in frames]
+    n_runs = len(runs)
+    targets, rank = np.unique(np.concatenate(stamps), return_inverse=True)
+    run = np.repeat(np.arange(n_runs, dtype=np.int64), [len(s) for s in stamps])
+    keys = rank.astype(np.int64) * n_runs + run
+    order = np.argsort(keys, kind='stable')
+    return {
+        'issue_times': np.array([issue_time for issue_time, _ in runs], dtype=np.int64),
+        'frames': frames,
+        'targets': targets,
+        'keys': keys[order],
+        'run': run[order],
+        'row': np.concatenate([np.arange(len(s), dtype=np.int64) for s in stamps])[order],
+    }
+
+
+def as_of(target_ns, issue_time_ns=None, horizon_hours=None):
+    """
+    每个目标时间可使用的最晚发布时间：不晚于 issue_time_ns，且（给定 horizon_hours 时）
+    不晚于 目标时间 - horizon_hours。都未给定时不限制。
+    """
+    target_ns = np.asarray(target_ns, dtype=np.int64)
+    asof = np.full(len(target_ns), np.iinfo(np.int64).max)
+    if issue_time_ns is not None:
+        asof = np.minimum(asof, issue_time_ns)
+    if horizon_hours is not None:
+        asof = np.minimum(asof, target_ns - int(horizon_hours * HOUR_NS))
+    return asof
+
+
+def latest_rows(index, target_ns, asof_ns):
+    """
+    对每个目标时间取发布时间 <= asof_ns（与 target_ns 等长）的最新批次。
+    返回 (批次序号, 批次表中的行号)，没有符合条件的批次时为 -1。
+    """
+    target_ns = np.asarray(target_ns, dtype=np.int64)
+    missing = np.full(len(target_ns), -1, dtype=np.int64)
+    if index is None or len(target_ns) == 0 or len(index['targets']) == 0:
+        return missing, missing.copy()
+    n_runs = len(index['issue_times'])
+    rank = np.searchsorted(index['targets'], target_ns).clip(max=len(index['targets']) - 1)
+    issued = np.searchsorted(index['issue_times'], asof_ns, side='right') # 发布时间 <= asof 的批次数
+    pos = np.searchsorted(index['keys'], rank * n_runs + issued, side='left') - 1
+    safe = pos.clip(min=0)
+    found = (index['targets'][rank] == target_ns) & (pos >= 0) & (index['keys'][safe] // n_runs == rank)
+    return np.where(found, index['run'][safe], -1), np.where(found, index['row'][safe], -1)
+
+
+def select(index, station_names, target_ns, asof_ns):
+    """
+    各站点在每个目标时间上发布时间 <= asof_ns 且含该站点数值（非 NaN）的最新预报。
+    返回 (预报值 (站点数, 目标数) float64, 所用批次的发布时间 (站点数, 目标数) int64)，
+    没有符合条件的批次时为 NaN / -1。每轮只对仍未找到数值的 (站点, 目标时间) 查询，
+    并把其 asof 改为本轮批次发布时间之前，因此最多查询批次数轮。
+    """
+    target_ns = np.asarray(target_ns, dtype=np.int64)
+    shape = (len(station_names), len(target_ns))
+    values = np.full(shape, np.nan)
+    issued = np.full(shape, -1, dtype=np.int64)
+    if index is None:
+        return values, issued
+    asof = np.broadcast_to(np.asarray(asof_ns, dtype=np.int64), shape).copy()
+    pending = np.ones(shape, dtype=bool)
+    columns = [frame.columns.get_indexer(station_names) for frame in index['frames']]
+    while pending.any():
+        station, target = np.nonzero(pending)
+        run, row = latest_rows(index, target_ns[target], asof[station, target])
+        found = run >= 0
+        pending[station[~found], target[~found]] = False
+        station, target, run, row = station[found], target[found], run[found], row[found]
+        value = np.full(len(run), np.nan)
+        for r in np.unique(run):
+            points = np.flatnonzero(run == r)
+            cols = columns[r][station[points]]
+            has_column = cols >= 0
+            points = points[has_column]
+            value[points] = index['frames'][r].to_numpy()[row[points], cols[has_column]]
+        ok = ~np.isnan(value)
+        values[station[ok], target[ok]] = value[ok]
+        issued[station[ok], target[ok]] = index['issue_times'][run[ok]]
+        pending[station[ok], target[ok]] = False
+        asof[station[~ok], target[~ok]] = index['issue_times'][run[~ok]] - 1 # 下一轮只看更早的批次
+    return values, issued
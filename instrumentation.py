@@ -0,0 +1,153 @@
+# instrumentation.py
+"""
+轻量的进程内运行指标：计数器、直方图，以及采集时才读取的回调量（缓存命中数、快照版本等），
+以 Prometheus 文本格式 (text/plain; version=0.0.4) 导出。
+
+记录一次观测只是一次二分查找加几个整数/浮点加法（在锁内完成），不做任何 I/O，
+可以放在请求热路径上。指标按进程统计：gunicorn 多 worker 部署时每次抓取只看到
+处理该次请求的 worker，需要按实例聚合时可在抓取端加上 worker 标识。
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# 请求耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 数据加载/热加载耗时的分桶（秒）
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """只增不减的计数器。标签值按 labelnames 的顺序以位置参数传入。"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in sorted(items):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """固定分桶的直方图，导出累计的 _bucket、_sum、_count。"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # 标签值 -> [各桶计数..., +Inf 桶计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """计时上下文：with histogram.time('label'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                yield self.name + '_bucket', _format_labels(self.labelnames, labels, ('le', _format_value(bound))), cumulative
+            yield self.name + '_sum', _format_labels(self.labelnames, labels), series[-1]
+            yield self.name + '_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class Callback:
+    """
+    采集时调用 func() 读取的指标（gauge 或 counter），用于导出已由其他代码维护的数值，
+    如响应缓存的命中数、当前快照版本。func 返回一个数值，或 {标签值元组: 数值}。
+    """
+
+    def __init__(self, name, documentation, func, type_name='gauge', labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.type_name = type_name
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.func()
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                yield self.name, _format_labels(self.labelnames, labels), v
+        elif value is not None:
+            yield self.name, '', value
+
+
+class Registry:
+    """指标注册表，render() 生成 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, func, type_name='gauge', labelnames=()):
+        return self.register(Callback(name, documentation, func, type_name, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,174 @@
+# metrics.py
+"""
+预测精度指标：MAE、RMSE、MAPE、偏差 (bias)，以及按装机容量归一化的 nMAE / nRMSE。
+
+加载时对对齐后的预测/实际数据做一次向量化计算，得到每个站点每小时的部分和
+（样本数、误差和、绝对误差和、平方误差和、APE 和及其样本数），以 float32 保存；
+另按 CUMULATIVE_BLOCK_HOURS 个小时一块做 float64 累加，作为粗粒度的累加索引。
+查询任意时间范围时整小时部分直接取小时级部分和（合计时用累加索引相减，只补两端不足一块的小时），
+再加上两端不足一小时的原始行；按天、按一天中的小时分组时也只在小时级部分和上汇总，不必重新扫描原始数据。
+
+数值数组均按站点连续存放，形状为 (站点数, 时间点数)。
+"""
+import numpy as np
+
+from downsample import DAY_NS, HOUR_NS, ROLLUP_STATION_CHUNK as STATION_CHUNK
+
+STATS = ('count', 'sum_error', 'sum_abs_error', 'sum_sq_error', 'sum_ape', 'count_ape')
+# 实际出力低于装机容量的该比例时不计入 MAPE（夜间/弱光时段分母接近 0，百分比误差无意义）
+MAPE_MIN_CAPACITY_FRACTION = 0.05
+HOURLY_DTYPE = np.float32 # 小时级部分和的存储类型；汇总时转为 float64
+CUMULATIVE_BLOCK_HOURS = 24 # 累加索引每块包含的小时数（按小时序号分块，不要求是自然日）
+
+
+def estimate_capacity(truth):
+    """没有装机容量数据时，以各站点实际出力的历史最大值近似装机容量；无法估计时为 NaN。"""
+    capacity = np.fmax.reduce(np.asarray(truth, dtype=np.float64), axis=1, initial=-np.inf)
+    capacity[~np.isfinite(capacity) | (capacity <= 0)] = np.nan
+    return capacity
+
+
+def hourly_partial_sums(stamps, pred, truth, capacity):
+    """
+    对齐的预测/实际数据按整点小时求部分和。
+    返回 (每小时起点 int64 纳秒, {统计量: (站点数, 小时数) float64})。
+    """
+    n_stations = pred.shape[0]
+    if len(stamps) == 0:
+        return np.empty(0, dtype=np.int64), {k: np.empty((n_stations, 0)) for k in STATS}
+    hours = stamps // HOUR_NS
+    group_starts = np.flatnonzero(np.concatenate(([True], hours[1:] != hours[:-1])))
+    parts = {k: [] for k in STATS}
+    for lo in range(0, n_stations, STATION_CHUNK):
+        p = np.asarray(pred[lo:lo + STATION_CHUNK], dtype=np.float64)
+        t = np.asarray(truth[lo:lo + STATION_CHUNK], dtype=np.float64)
+        cap = capacity[lo:lo + STATION_CHUNK, None]
+        err = p - t
+        valid = ~np.isnan(err)
+        err = np.where(valid, err, 0.0)
+        with np.errstate(invalid='ignore'):
+            ape_valid = valid & (t >= MAPE_MIN_CAPACITY_FRACTION * cap)
+        ape = np.where(ape_valid, np.abs(err) / np.where(ape_valid, t, 1.0), 0.0)
+        values = {
+            'count': valid.astype(np.float64),
+            'sum_error': err,
+            'sum_abs_error': np.abs(err),
+            'sum_sq_error': err * err,
+            'sum_ape': ape,
+            'count_ape': ape_valid.astype(np.float64),
+        }
+        for k in STATS:
+            parts[k].append(np.add.reduceat(values[k], group_starts, axis=1))
+    return hours[group_starts] * HOUR_NS, {k: np.concatenate(v) for k, v in parts.items()}
+
+
+def block_cumulative(hourly):
+    """小时级部分和 (站点数, 小时数) -> 每 CUMULATIVE_BLOCK_HOURS 小时一块的 float64 累加 (站点数, 块数 + 1)。"""
+    n_hours = hourly.shape[1]
+    cumulative = np.zeros((hourly.shape[0], -(-n_hours // CUMULATIVE_BLOCK_HOURS) + 1))
+    if n_hours:
+        block_sums = np.add.reduceat(hourly, np.arange(0, n_hours, CUMULATIVE_BLOCK_HOURS), axis=1, dtype=np.float64)
+        np.cumsum(block_sums, axis=1, out=cumulative[:, 1:])
+    return cumulative
+
+
+def build_rollup(stamps, n_stations, load_stations, capacity=None):
+    """
+    加载时构建指标预聚合。load_stations(lo, hi) 返回站点 [lo, hi) 在 stamps 各时间点上的
+    (预测, 实际) 数组，按站点分批调用以限制内存。capacity 中为 NaN（或未提供）的站点
+    用 estimate_capacity() 估计。
+    结果包含小时起点、小时级部分和 hourly (站点数, 小时数) float32、
+    粗粒度累加索引 cumulative (站点数, 块数 + 1) float64 以及覆盖到的最后时间点。
+    """
+    capacity = np.full(n_stations, np.nan) if capacity is None else np.array(capacity, dtype=np.float64)
+    hour_start = np.unique(np.asarray(stamps, dtype=np.int64) // HOUR_NS) * HOUR_NS
+    hourly = {k: np.empty((n_stations, len(hour_start)), dtype=HOURLY_DTYPE) for k in STATS}
+    for lo in range(0, n_stations, STATION_CHUNK):
+        hi = min(lo + STATION_CHUNK, n_stations)
+        pred, truth = load_stations(lo, hi)
+        missing = np.isnan(capacity[lo:hi])
+        capacity[lo:hi][missing] = estimate_capacity(truth)[missing]
+        _, sums = hourly_partial_sums(stamps, pred, truth, capacity[lo:hi])
+        for k in STATS:
+            hourly[k][lo:hi] = sums[k]
+    return {
+        'hour_start': hour_start,
+        'hourly': hourly,
+        'cumulative': {k: block_cumulative(hourly[k]) for k in STATS},
+        'capacity': capacity,
+        'covered_until': int(stamps[-1]) if len(stamps) else None,
+    }
+
+
+def _prefix_sums(rollup, k, rows, position):
+    """站点 rows 在前 position 个小时上的部分和合计 (站点数,)：累加索引取整块，其余小时直接求和。"""
+    block = position // CUMULATIVE_BLOCK_HOURS
+    partial = rollup['hourly'][k][rows, block * CUMULATIVE_BLOCK_HOURS:position]
+    return rollup['cumulative'][k][rows, block] + partial.sum(axis=1, dtype=np.float64)
+
+
+def range_hourly_sums(rollup, rows, start_ns, end_ns, raw_rows, total=False):
+    """
+    [start_ns, end_ns] 内指定站点（rows 为站点下标）的小时级部分和。
+    完整落在范围内的小时取自小时级部分和；两端不足一小时的部分以及 covered_until
+    之后追加的行，通过 raw_rows(lo_ns, hi_ns) -> (stamps, pred, truth) 取原始数据现算。
+    total=True 时完整小时部分只返回一列合计（由累加索引相减得到，不逐小时汇总），供 group='total' 使用。
+    返回 (小时起点数组, {统计量: (站点数, 小时数)} float64)，小时起点可能重复（同一小时分段计算时），按时间排序。
+    """
+    capacity = rollup['capacity'][rows]
+    hour_start = rollup['hour_start']
+    lo = np.searchsorted(hour_start, start_ns, side='left')
+    hi = np.searchsorted(hour_start, end_ns - HOUR_NS + 1, side='right')
+    if rollup['covered_until'] is None or lo >= hi:
+        return hourly_partial_sums(*raw_rows(start_ns, end_ns), capacity)
+
+    if total:
+        stored_starts = hour_start[lo:lo + 1]
+        stored = {k: (_prefix_sums(rollup, k, rows, hi) - _prefix_sums(rollup, k, rows, lo))[:, None] for k in STATS}
+    else:
+        stored_starts = hour_start[lo:hi]
+        stored = {k: rollup['hourly'][k][rows, lo:hi].astype(np.float64) for k in STATS}
+    rolled_until = rollup['covered_until'] if hi == len(hour_start) else hour_start[hi - 1] + HOUR_NS - 1
+    head_starts, head = hourly_partial_sums(*raw_rows(start_ns, hour_start[lo] - 1), capacity)
+    tail_starts, tail = hourly_partial_sums(*raw_rows(rolled_until + 1, end_ns), capacity)
+    starts = np.concatenate([head_starts, stored_starts, tail_starts])
+    return starts, {k: np.concatenate([head[k], stored[k], tail[k]], axis=1) for k in STATS}
+
+
+def group_sums(hour_start, sums, group):
+    """
+    把小时级部分和按 group 汇总：
+      'total'       -> 键为 None，值形状 (站点数, 1)
+      'day'         -> 键为每天起点（纳秒）
+      'hour_of_day' -> 键为 0..23
+    """
+    if group == 'total':
+        return None, {k: v.sum(axis=1, keepdims=True) for k, v in sums.items()}
+    if group == 'day':
+        days = hour_start // DAY_NS
+        if len(days) == 0:
+            return np.empty(0, dtype=np.int64), {k: v[:, :0] for k, v in sums.items()}
+        group_starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+        return days[group_starts] * DAY_NS, {k: np.add.reduceat(v, group_starts, axis=1) for k, v in sums.items()}
+    if group == 'hour_of_day':
+        one_hot = ((hour_start // HOUR_NS % 24)[:, None] == np.arange(24)[None, :]).astype(np.float64)
+        return np.arange(24), {k: v @ one_hot for k, v in sums.items()}
+    raise ValueError(f"Unknown group: {group}")
+
+
+def finalize(sums, capacity):
+    """部分和 -> 指标。MAPE、nMAE、nRMSE 为百分比；样本数为 0 的位置为 NaN。"""
+    capacity = capacity[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        count = sums['count']
+        mae = sums['sum_abs_error'] / count
+        rmse = np.sqrt(sums['sum_sq_error'] / count)
+        return {
+            'count': count,
+            'mae': mae,
+            'rmse': rmse,
+            'bias': sums['sum_error'] / count,
+            'mape': sums['sum_ape'] / sums['count_ape'] * 100,
+            'nmae': mae / capacity * 100,
+            'nrmse': rmse / capacity * 100,
+        }
@@ -0,0 +1,154 @@
+# spatial.py
+"""
+站点坐标的空间索引：经纬度上的均匀网格，纯 NumPy 实现。
+
+站点按所在网格单元（行优先编号）排序存放，每个单元在排序数组中是连续的一段，
+单元起点由 cell_starts 给出。矩形查询对覆盖到的每一行网格只取一段连续切片再精确过滤，
+开销为 O(覆盖的网格行数 + 结果数)；最近 N 个站点查询通过逐步扩大的矩形查询完成。
+坐标单位为度，距离为大圆距离（公里）。bbox_rows() 不处理跨越 180° 经线的矩形，
+最近站点查询会把跨越 180° 经线的搜索范围拆成两个矩形。
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+HALF_CIRCUMFERENCE_KM = np.pi * EARTH_RADIUS_KM # 球面上任意两点的最大距离
+TARGET_PER_CELL = 8 # 每个网格单元的平均站点数
+
+
+def build_index(lon, lat, positions):
+    """
+    lon、lat 为各站点坐标，positions 为对应的站点下标（如在 station_names 中的位置）。
+    坐标为 NaN 的站点不进入索引。没有有效坐标时返回 None。
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.int64)
+    valid = ~np.isnan(lon) & ~np.isnan(lat)
+    lon, lat, positions = lon[valid], lat[valid], positions[valid]
+    if len(lon) == 0:
+        return None
+
+    cells_per_axis = max(1, int(np.ceil(np.sqrt(len(lon) / TARGET_PER_CELL))))
+    origin = (lon.min(), lat.min())
+    # 范围为 0（如只有一个站点）时单元宽度取 1 度，避免除零
+    cell_size = tuple(max((hi - lo) / cells_per_axis, 1e-9) if hi > lo else 1.0
+                      for lo, hi in ((lon.min(), lon.max()), (lat.min(), lat.max())))
+    nx = ny = cells_per_axis
+    ix = np.minimum(((lon - origin[0]) / cell_size[0]).astype(np.int64), nx - 1)
+    iy = np.minimum(((lat - origin[1]) / cell_size[1]).astype(np.int64), ny - 1)
+    cell = iy * nx + ix
+    order = np.argsort(cell, kind='stable')
+    return {
+        'origin': origin,
+        'cell_size': cell_size,
+        'shape': (nx, ny),
+        'cell_starts': np.searchsorted(cell[order], np.arange(nx * ny + 1)),
+        'lon': lon[order],
+        'lat': lat[order],
+        'positions': positions[order],
+    }
+
+
+def _cell_range(value_lo, value_hi, origin, size, count):
+    lo = int(np.floor((value_lo - origin) / size))
+    hi = int(np.floor((value_hi - origin) / size))
+    return max(lo, 0), min(hi, count - 1)
+
+
+def bbox_rows(index, min_lon, min_lat, max_lon, max_lat):
+    """矩形 [min_lon, max_lon] × [min_lat, max_lat] 内的站点在索引排序数组中的行号。"""
+    if index is None or min_lon > max_lon or min_lat > max_lat:
+        return np.empty(0, dtype=np.int64)
+    nx, ny = index['shape']
+    x0, x1 = _cell_range(min_lon, max_lon, index['origin'][0], index['cell_size'][0], nx)
+    y0, y1 = _cell_range(min_lat, max_lat, index['origin'][1], index['cell_size'][1], ny)
+    if x0 > x1 or y0 > y1:
+        return np.empty(0, dtype=np.int64)
+    starts = index['cell_starts']
+    rows = np.arange(y0, y1 + 1) * nx
+    lo, hi = starts[rows + x0], starts[rows + x1 + 1]
+    candidates = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+    lon, lat = index['lon'][candidates], index['lat'][candidates]
+    inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+    return candidates[inside]
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(v) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _radius_bboxes(lon, lat, radius_km):
+    """
+    覆盖以 (lon, lat) 为中心、半径 radius_km 的圆的矩形列表（经度方向按矩形内最高纬度放宽）。
+    圆包含极点时覆盖全部经度；跨越 180° 经线时拆成两个矩形。
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if abs(lat) + dlat >= 90:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+    dlon = dlat / np.cos(np.radians(abs(lat) + dlat))
+    if dlon >= 180:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return [(min_lon + 360, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
+def _radius_rows(index, lon, lat, radius_km):
+    """_radius_bboxes() 各矩形内的站点行号（矩形互不重叠）。"""
+    return np.concatenate([bbox_rows(index, *bbox) for bbox in _radius_bboxes(lon, lat, radius_km)])
+
+
+def nearest_rows(index, lon, lat, n):
+    """
+    距 (lon, lat) 最近的 n 个站点：(排序数组中的行号, 距离公里)，按距离升序。
+    从一个网格单元大小的半径开始，矩形内站点不足 n 个时半径加倍；够 n 个后以第 n 近的距离
+    为半径再查一次，保证不会漏掉矩形角落之外但距离更近的站点。
+    半径超过半个地球周长时直接对全部站点计算距离。
+    """
+    if index is None or n <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    total = len(index['lon'])
+    n = min(n, total)
+    all_rows = np.arange(total)
+    radius_km = max(index['cell_size']) * KM_PER_DEGREE
+    while True:
+        if radius_km >= HALF_CIRCUMFERENCE_KM:
+            rows = all_rows
+            break
+        rows = _radius_rows(index, lon, lat, radius_km)
+        if len(rows) >= n or len(rows) == total:
+            break
+        radius_km *= 2
+    distance = haversine_km(lon, lat, index['lon'][rows], index['lat'][rows])
+    kth = np.partition(distance, n - 1)[n - 1]
+    if kth > radius_km and len(rows) < total:
+        rows = _radius_rows(index, lon, lat, kth)
+        distance = haversine_km(lon, lat, index['lon'][rows], index['lat'][rows])
+    order = np.argsort(distance, kind='stable')[:n]
+    return rows[order], distance[order]
+
+
+def cluster_rows(index, rows, bbox, grid):
+    """
+    把矩形内的站点按 grid × grid 的网格聚合（地图缩小时使用）。
+    返回 (每个非空单元内站点行号的分组列表, 单元编号数组)，组按单元编号排序。
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    width = max(max_lon - min_lon, 1e-9) / grid
+    height = max(max_lat - min_lat, 1e-9) / grid
+    ix = np.clip(((index['lon'][rows] - min_lon) / width).astype(np.int64), 0, grid - 1)
+    iy = np.clip(((index['lat'][rows] - min_lat) / height).astype(np.int64), 0, grid - 1)
+    cell = iy * grid + ix
+    order = np.argsort(cell, kind='stable')
+    cell, rows = cell[order], rows[order]
+    if len(cell) == 0:
+        return [], cell
+    starts = np.flatnonzero(np.concatenate(([True], cell[1:] != cell[:-1])))
+    return np.split(rows, starts[1:]), cell[starts]
@@ -10,6 +10,7 @@ const nextValueSpan = document.getElementById('nextValue');
 const highlightIndicator = document.getElementById('highlightIndicator');
 const ctx = document.getElementById('predictionChart').getContext('2d');
 const breadcrumbStationName = document.getElementById('breadcrumb-station-name'); // 获取面包屑导航中显示站名的 span 元素
+const stationSearch = document.getElementById('stationSearch'); // 站点搜索框
 // --- 全局变量和配置 ---
 let predictionChart = null; // 存储 Chart 实例
 const highlightColor = 'red'; // 高亮颜色
@@ -17,6 +18,11 @@ const defaultPointColor = 'rgba(255, 99, 132, 0.6)'; // 预测曲线点的默认
 const defaultBorderColor = 'rgb(255, 99, 132)';     // 预测曲线线条的默认颜色
 const highlightBorderColor = 'darkred';            // 高亮点的边框颜色
 const defaultUnit = 'MW';                          // 默认单位
+const stationPageSize = parseInt(stationSelector.dataset.pageSize, 10) || 50; // 每次加载的站点选项数
+const MORE_OPTION_VALUE = '__more__';              // “加载更多”选项的值
+let stationQuery = '';                             // 当前的搜索前缀
+let loadedStationCount = 0;                        // 当前搜索已加载的选项数（即下一页的 offset）
+let lastStationValue = stationSelector.value;      // 最近一次选中的真实站点
 
 // --- 函数定义 ---
 
@@ -249,6 +255,71 @@ async function updateChart(stationName, dateString) {
     }
 }
 
+/**
+ * 从 /api/stations 分页加载站点选项（站点较多时不在页面中一次性渲染全部选项）
+ * @param {string} query - 站点 ID 或名称前缀，空字符串表示全部站点
+ * @param {boolean} append - true 时追加下一页，否则替换为新搜索的第一页
+ */
+async function loadStationOptions(query, append) {
+    const offset = append ? loadedStationCount : 0;
+    const apiUrl = `/api/stations?q=${encodeURIComponent(query)}&offset=${offset}&limit=${stationPageSize}`;
+    try {
+        const response = await fetch(apiUrl);
+        if (!response.ok) throw new Error(`获取电站列表失败 (${response.status})`);
+        const data = await response.json();
+        if (query !== stationSearch.value.trim()) return; // 输入已变化，丢弃过期的结果
+
+        const moreOption = stationSelector.querySelector(`option[value="${MORE_OPTION_VALUE}"]`);
+        if (moreOption) moreOption.remove();
+        if (!append) {
+            // 保留当前选中的站点，避免搜索时图表对应的站点被意外切换
+            Array.from(stationSelector.options).forEach(option => {
+                if (option.value !== lastStationValue) option.remove();
+            });
+        }
+        const existing = new Set(Array.from(stationSelector.options, option => option.value));
+        data.stations.forEach(station => {
+            if (!existing.has(station.id)) stationSelector.add(new Option(station.display, station.id));
+        });
+        stationQuery = query;
+        loadedStationCount = offset + data.stations.length;
+        if (loadedStationCount < data.total) {
+            stationSelector.add(new Option(`加载更多... (已显示 ${loadedStationCount} / ${data.total})`, MORE_OPTION_VALUE));
+        }
+        stationSelector.value = lastStationValue;
+    } catch (error) {
+        console.error("加载电站列表时出错:", error);
+        messageDiv.textContent = error.message;
+    }
+}
+
+/**
+ * 下拉菜单变化：选中“加载更多”时加载下一页并恢复原选中项，否则更新图表
+ */
+function handleStationChange() {
+    if (stationSelector.value === MORE_OPTION_VALUE) {
+        stationSelector.value = lastStationValue;
+        loadStationOptions(stationQuery, true);
+        return;
+    }
+    lastStationValue = stationSelector.value;
+    if (breadcrumbStationName && stationSelector.selectedIndex >= 0) {
+        breadcrumbStationName.textContent = stationSelector.options[stationSelector.selectedIndex].text;
+    }
+    handleSelectionChange();
+}
+
+// 搜索框输入后稍作延迟再请求，避免每个按键都发请求
+let stationSearchTimer = null;
+stationSearch.addEventListener('input', () => {
+    clearTimeout(stationSearchTimer);
+    stationSearchTimer = setTimeout(() => loadStationOptions(stationSearch.value.trim(), false), 250);
+});
+// 首次展开下拉菜单时才加载第一页
+stationSelector.addEventListener('focus', () => {
+    if (loadedStationCount === 0) loadStationOptions(stationSearch.value.trim(), false);
+}, { once: true });
+
 // --- 事件监听器设置 ---
 
 /**
@@ -261,7 +332,7 @@ function handleSelectionChange() {
 }
 
 // 绑定事件监听器
-stationSelector.addEventListener('change', handleSelectionChange);
+stationSelector.addEventListener('change', handleStationChange);
 dateSelector.addEventListener('change', handleSelectionChange);
 
 // --- 页面初始化 (修改) ---